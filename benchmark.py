@@ -0,0 +1,200 @@
+# benchmark.py
+"""
+Runs seeded trials of the planners on the maps in mapping.py in a process pool and writes the
+results as CSV and JSON together with summary statistics.
+
+    python3 benchmark.py --planners rrt_star informed_rrt_star --maps simple2 --trials 100
+
+writes benchmark.csv (one row per trial), benchmark_summary.csv and benchmark.json.
+Everything runs headless.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+import mapping
+import profiling
+import sampling
+from planner import Planner, ALGORITHMS
+
+
+MAPS = {"empty": mapping.draw_empty_map,
+        "simple": mapping.draw_simple_map,
+        "simple1": mapping.draw_simple_map1,
+        "simple2": mapping.draw_simple_map2}
+
+# planner names of the bidirectional modes and the algorithm they run
+BIDIRECTIONAL = {"rrt_connect": "rrt",
+                 "bi_rrt_star": "rrt_star"}
+
+METRICS = ("solution_found", "time_to_first_solution", "iterations_to_first_solution", "final_cost",
+           "iterations", "num_of_nodes", "planning_time", "edge_cache_hits", "edge_cache_misses",
+           "peak_memory_mb")
+
+# metrics of the trials run with --profile, see profiling.py
+PROFILE_METRICS = tuple(phase + "_time" for phase in profiling.PHASES) + ("other_time",) + profiling.COUNTERS
+
+
+"""
+peak resident memory of the current process in MB
+"""
+def peak_memory_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    if sys.platform == "darwin":
+        return peak / 2 ** 20
+    return peak / 2 ** 10
+
+
+"""
+runs one trial and returns its metrics as a dictionary
+
+trial: dictionary {"planner", "sampling", "map", "seed", "start_point", "goal_point", "parameters"}
+"""
+def run_trial(trial):
+    map_ = MAPS[trial["map"]]() if trial["map"] in MAPS else trial["map"]
+    planner = Planner(map_, algorithm=BIDIRECTIONAL.get(trial["planner"], trial["planner"]),
+                      bidirectional=trial["planner"] in BIDIRECTIONAL, sampling_strategy=trial["sampling"],
+                      seed=trial["seed"], **trial["parameters"])
+    result = planner.plan(tuple(trial["start_point"]), tuple(trial["goal_point"]))
+    return {"planner": trial["planner"],
+            "sampling": trial["sampling"],
+            "map": trial["map"],
+            "seed": trial["seed"],
+            "solution_found": result.solution_found,
+            "time_to_first_solution": result.first_solution_time,
+            "iterations_to_first_solution": result.first_solution_iteration,
+            "final_cost": result.cost if result.solution_found else None,
+            "iterations": result.iterations,
+            "num_of_nodes": result.num_of_nodes,
+            "planning_time": result.planning_time,
+            "edge_cache_hits": result.edge_cache_hits,
+            "edge_cache_misses": result.edge_cache_misses,
+            "peak_memory_mb": peak_memory_mb(),
+            **profile_metrics(result.stats)}
+
+
+def profile_metrics(stats):
+    if stats is None:
+        return {}
+    metrics = {phase + "_time": seconds for phase, seconds in stats.phase_times.items()}
+    metrics["other_time"] = stats.other_time
+    metrics.update(stats.counts)
+    return metrics
+
+
+def summarize(results):
+    groups = {}
+    for result in results:
+        groups.setdefault((result["planner"], result["sampling"], result["map"]), []).append(result)
+
+    summary = []
+    for (planner, strategy, map_name), group in sorted(groups.items()):
+        row = {"planner": planner, "sampling": strategy, "map": map_name, "trials": len(group),
+               "success_rate": sum(r["solution_found"] for r in group) / len(group)}
+        for metric in METRICS[1:] + PROFILE_METRICS:
+            values = [r[metric] for r in group if r.get(metric) is not None]
+            if not values:
+                continue
+            row[metric + "_mean"] = statistics.mean(values)
+            row[metric + "_median"] = statistics.median(values)
+            row[metric + "_stdev"] = statistics.stdev(values) if len(values) > 1 else 0.0
+            row[metric + "_min"] = min(values)
+            row[metric + "_max"] = max(values)
+        summary.append(row)
+    return summary
+
+
+def write_csv(file_name, rows):
+    keys = []
+    for row in rows:
+        keys.extend(key for key in row if key not in keys)
+    with open(file_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=keys)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the planners on the maps in mapping.py")
+    parser.add_argument("--planners", nargs="+", default=list(ALGORITHMS), choices=ALGORITHMS + tuple(BIDIRECTIONAL),
+                        help="rrt_connect and bi_rrt_star are the bidirectional modes of rrt and rrt_star")
+    parser.add_argument("--maps", nargs="+", default=["simple2"],
+                        help="names of maps in mapping.py ({}) or paths of map files".format(", ".join(sorted(MAPS))))
+    parser.add_argument("--trials", type=int, default=20, help="trials per planner and map")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first trial")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--start", type=int, nargs=2, default=(100, 150))
+    parser.add_argument("--goal", type=int, nargs=2, default=(200, 150))
+    parser.add_argument("--iterations", type=int, default=50000)
+    parser.add_argument("--goal-radius", type=float, default=12)
+    parser.add_argument("--rewiring-radius", type=int, default=25)
+    parser.add_argument("--cbest", type=float, default=.95)
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--batch-size", type=int, default=200, help="samples per batch of BIT*")
+    parser.add_argument("--sampling", nargs="+", default=["uniform"], choices=sampling.STRATEGIES,
+                        help="sampling strategies, every one is run as a separate configuration")
+    parser.add_argument("--goal-bias", type=float, default=.05)
+    parser.add_argument("--path-bias", type=float, default=.2)
+    parser.add_argument("--obstacle-bias", type=float, default=.5, help="share of bridge or gaussian samples")
+    parser.add_argument("--lazy", action="store_true", help="check the edges of RRT* and informed RRT* lazily")
+    parser.add_argument("--profile", action="store_true", help="add the phase times and counters of profiling.py to the metrics")
+    parser.add_argument("--output", default="benchmark", help="prefix of the output files")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for map_name in args.maps:
+        if map_name not in MAPS and not os.path.isfile(map_name):
+            raise Exception("unknown map: " + map_name)
+    parameters = {"num_of_iterations": args.iterations,
+                  "goal_radius": args.goal_radius,
+                  "rewiring_radius": args.rewiring_radius,
+                  "cbest": args.cbest,
+                  "time_limit": args.time_limit,
+                  "goal_bias": args.goal_bias,
+                  "path_bias": args.path_bias,
+                  "obstacle_bias": args.obstacle_bias,
+                  "batch_size": args.batch_size,
+                  "lazy": args.lazy,
+                  "profile": args.profile}
+    trials = [{"planner": planner, "sampling": strategy, "map": map_name, "seed": args.seed + i,
+               "start_point": args.start, "goal_point": args.goal, "parameters": parameters}
+              for planner in args.planners for strategy in args.sampling for map_name in args.maps
+              for i in range(args.trials)]
+
+    # preprocess the maps once here, forked workers inherit the cache
+    for map_name in args.maps:
+        if map_name in MAPS:
+            mapping.get_occupancy_map(MAPS[map_name]())
+        else:
+            mapping.load_occupancy_map(map_name)
+
+    start_time = time.time()
+    results = []
+    # a fresh worker per trial keeps the peak memory of one trial from leaking into the next
+    with multiprocessing.Pool(args.workers, maxtasksperchild=1) as pool:
+        for result in pool.imap_unordered(run_trial, trials):
+            results.append(result)
+            print(f"{len(results)}/{len(trials)} {result['planner']} {result['sampling']} {result['map']} seed {result['seed']}: "
+                  f"cost {result['final_cost']}  time {result['planning_time']:.3f}s")
+    results.sort(key=lambda r: (r["planner"], r["sampling"], r["map"], r["seed"]))
+    summary = summarize(results)
+
+    write_csv(args.output + ".csv", results)
+    write_csv(args.output + "_summary.csv", summary)
+    with open(args.output + ".json", "w") as f:
+        json.dump({"arguments": vars(args), "summary": summary, "trials": results}, f, indent=2)
+
+    print(f"{len(trials)} trials in {time.time() - start_time:.1f}s")
+    print("Output written to {}.csv, {}_summary.csv and {}.json".format(args.output, args.output, args.output))
+
+
+if __name__ == "__main__":
+    main()
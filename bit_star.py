@@ -0,0 +1,348 @@
+"""
+code based on this paper:
+https://arxiv.org/pdf/1405.5848.pdf
+"""
+
+# bit_star.py
+import mapping
+import math
+import heapq
+import time
+import spatial_index
+from tree import Tree, SolutionHeap, solution_record
+from sampling import InformedSampler
+from visualization import TreeRenderer
+
+
+def distance (pt1, pt2):
+    return math.sqrt(pow(pt2[0] - pt1[0], 2) + pow(pt2[1] - pt1[1], 2))
+
+
+def path_is_good(occupancy_map, pt1, pt2):
+    return occupancy_map.path_is_free(pt1, pt2)
+
+
+"""
+BatchSearch
+
+State of one BIT* search. The samples of a batch that are not in the tree yet are kept in a
+spatial index, and the search works through two queues:
+    vertex_queue - tree nodes to expand, ordered by c2c + heuristic cost to go
+    edge_queue   - candidate edges (node, point), ordered by c2c of node + length of the edge +
+                   heuristic cost to go from point
+The heuristics are straight line distances, so an edge whose key is not lower than the cost of
+the best solution can not improve it, and only the edges that can are checked against the map.
+
+The cost to go of a point is its distance to the edge of the goal region.
+"""
+class BatchSearch:
+    def __init__(self, occupancy_map, tree:Tree, node_index, start_point, goal_point, goal_radius,
+                 rewiring_radius, sampler, renderer:TreeRenderer=None):
+        self.occupancy_map = occupancy_map
+        self.tree = tree
+        self.node_index = node_index
+        self.start_point = start_point
+        self.goal_point = goal_point
+        self.goal_radius = goal_radius
+        self.rewiring_radius = rewiring_radius
+        self.sampler = sampler
+        self.renderer = renderer
+        self.solutions = SolutionHeap(tree)
+        self.samples = set()
+        self.sample_index = None
+        self.vertex_queue = []
+        self.edge_queue = []
+        self.expanded = set()
+        # nodes that have been searched for rewires once, they are only expanded towards samples again
+        self.old_nodes = set()
+        self.edge_count = 0
+        # samples that were already in the tree, or pruned before they were connected to it
+        self.rejected_samples = 0
+
+    def cost_to_come_estimate(self, pt):
+        return distance(self.start_point, pt)
+
+    def cost_to_go_estimate(self, pt):
+        return max(distance(pt, self.goal_point) - self.goal_radius, 0)
+
+    """
+    cost of the best solution, inf if there is none
+    """
+    def best_cost(self):
+        best_solution = self.solutions.best()
+        if best_solution is None:
+            return float('inf')
+        return float(self.tree.c2c[best_solution])
+
+    """
+    prunes the samples that can not improve the solution, adds the new ones and queues every node
+    of the tree that can still lead to a better solution
+    """
+    def start_batch(self, new_samples):
+        best_cost = self.best_cost()
+        num_of_samples = len(self.samples)
+        self.samples = {pt for pt in self.samples
+                        if self.cost_to_come_estimate(pt) + self.cost_to_go_estimate(pt) < best_cost}
+        self.rejected_samples += num_of_samples - len(self.samples)
+        for pt in new_samples:
+            if self.tree.find(pt) is None:
+                self.samples.add(pt)
+            else:
+                self.rejected_samples += 1
+        self.sample_index = spatial_index.GridIndex(cell_size=self.rewiring_radius)
+        for pt in self.samples:
+            self.sample_index.insert(pt, pt)
+
+        self.edge_queue = []
+        self.vertex_queue = []
+        self.expanded = set()
+        for node in range(len(self.tree)):
+            self.queue_vertex(node, best_cost)
+
+    def queue_vertex(self, node, best_cost):
+        key = float(self.tree.c2c[node]) + self.cost_to_go_estimate(self.tree.coordinates(node))
+        if key < best_cost:
+            heapq.heappush(self.vertex_queue, (key, node))
+
+    def queue_edge(self, node, pt, best_cost):
+        key = float(self.tree.c2c[node]) + distance(self.tree.coordinates(node), pt) + self.cost_to_go_estimate(pt)
+        if key < best_cost:
+            heapq.heappush(self.edge_queue, (key, node, pt))
+
+    """
+    queues the edges from node to the samples around it and, the first time node is expanded, to
+    the nodes around it that it could rewire
+    """
+    def expand(self, node, best_cost):
+        self.expanded.add(node)
+        coordinates = self.tree.coordinates(node)
+        for pt in self.sample_index.radius(coordinates, self.rewiring_radius):
+            if pt in self.samples:
+                self.queue_edge(node, pt, best_cost)
+        if node in self.old_nodes:
+            return
+        self.old_nodes.add(node)
+        c2c = self.tree.c2c[node]
+        for neighbor in self.node_index.radius(coordinates, self.rewiring_radius):
+            if neighbor == self.tree.parent[node] or self.tree.parent[neighbor] == node:
+                continue
+            if c2c + distance(coordinates, self.tree.coordinates(neighbor)) < self.tree.c2c[neighbor]:
+                self.queue_edge(node, self.tree.coordinates(neighbor), best_cost)
+
+    """
+    processes the best edge of the batch. Returns False once the batch can not improve the
+    solution any more.
+    """
+    def process_next_edge(self):
+        best_cost = self.best_cost()
+        # expand the nodes that could queue an edge better than the current best one
+        while self.vertex_queue and (not self.edge_queue or self.vertex_queue[0][0] <= self.edge_queue[0][0]):
+            key, node = heapq.heappop(self.vertex_queue)
+            if node not in self.expanded:
+                self.expand(node, best_cost)
+        if not self.edge_queue:
+            return False
+        key, node, pt = heapq.heappop(self.edge_queue)
+        if key >= best_cost:
+            self.edge_queue = []
+            self.vertex_queue = []
+            return False
+
+        coordinates = self.tree.coordinates(node)
+        edge_cost = distance(coordinates, pt)
+        c2c = float(self.tree.c2c[node]) + edge_cost
+        target = self.tree.find(pt)
+        if target is None and pt not in self.samples:
+            return True
+        if target is not None and c2c >= self.tree.c2c[target]:
+            return True
+        # the estimate ignores the obstacles, so only edges that could improve the solution get here
+        if self.cost_to_come_estimate(coordinates) + edge_cost + self.cost_to_go_estimate(pt) >= best_cost:
+            return True
+        if c2c + self.cost_to_go_estimate(pt) >= best_cost:
+            return True
+        self.edge_count += 1
+        if not path_is_good(self.occupancy_map, coordinates, pt):
+            return True
+
+        if target is None:
+            target = self.tree.add_node(pt, c2c, node)
+            self.node_index.insert(pt, target)
+            self.samples.discard(pt)
+            if distance(pt, self.goal_point) < self.goal_radius:
+                self.solutions.add(target)
+            if self.renderer is not None:
+                self.renderer.add_edge(pt, coordinates)
+        else:
+            old_parent_coordinates = self.tree.parent_coordinates(target)
+            self.solutions.update(self.tree.rewire(target, node, c2c))
+            # the cost of target went down, so it may reach samples it could not improve before
+            self.expanded.discard(target)
+            if self.renderer is not None:
+                self.renderer.rewire_edge(pt, old_parent_coordinates, coordinates)
+        self.queue_vertex(target, best_cost)
+        return True
+
+
+"""
+occupancy_map - mapping.OccupancyMap - the map being explored
+tree - Tree - the explored nodes, holding only the start point when the search starts
+node_index - spatial index of the explored nodes
+num_of_iterations - maximum number of samples drawn
+rewiring_radius - radius of the neighborhood of a node that edges are queued to
+cbest - the search stops once cost_min / cost_max of the best solution reaches cbest
+time_limit - the search stops after this many seconds
+batch_size - number of samples drawn per batch
+renderer - TreeRenderer - draws the tree while it is explored. Pass None to run headless
+rng - numpy random Generator used by the sampler, a new unseeded one is used if None
+info - dictionary - if given, it is filled with "iterations" (samples drawn), "batches",
+                    "edge_checks", "rejected_samples" (see BatchSearch), and with "first_solution_time" and "first_solution_iteration"
+                    once a solution is found
+sampler - sampler of the sampling strategy, see sampling.create_sampler. An InformedSampler is
+          used if None
+on_solution - function called with tree.solution_record of the best solution every time it
+              improves. The search stops if it returns True
+stop - threading.Event, the search stops once it is set (see planner.Planner.solutions)
+returns the id of the best goal node, or None
+"""
+def explore(occupancy_map, tree:Tree, node_index, start_point:tuple, goal_point:tuple, goal_radius, num_of_iterations:int, \
+            rewiring_radius, cbest, time_limit, batch_size=200, renderer:TreeRenderer=None, rng=None, info:dict=None, sampler=None, \
+            on_solution=None, stop=None):
+    if sampler is None:
+        sampler = InformedSampler(occupancy_map, start_point, goal_point, rng=rng)
+    search = BatchSearch(occupancy_map, tree, node_index, start_point, goal_point, goal_radius,
+                         rewiring_radius, sampler, renderer)
+    start_time = time.time()
+    iterations = 0
+    batches = 0
+    lowest_cost = float('inf')
+    ellipse = None
+    stopped = False
+
+    while not stopped and iterations < num_of_iterations and time.time() - start_time < time_limit:
+        if stop is not None and stop.is_set():
+            break
+        best_solution = search.solutions.best()
+        new_samples = []
+        if best_solution is not None:
+            cost_max = tree.c2c[best_solution] + distance(goal_point, tree.coordinates(best_solution))
+            if sampler.cost_min / cost_max >= cbest:
+                break
+            sampler.set_best_cost(cost_max)
+            ellipse = sampler.ellipse()
+        elif batches == 0 and tree.find(goal_point) is None:
+            new_samples.append(goal_point)
+        count = min(batch_size, num_of_iterations - iterations)
+        new_samples.extend(sampler.sample() for _ in range(count))
+        iterations += count
+        batches += 1
+        search.start_batch(new_samples)
+
+        while time.time() - start_time < time_limit and not (stop is not None and stop.is_set()) \
+                and search.process_next_edge():
+            best_solution = search.solutions.best()
+            if best_solution is not None and tree.c2c[best_solution] < lowest_cost:
+                lowest_cost = tree.c2c[best_solution]
+                solution = [tree.coordinates(node) for node in backtrack(tree, best_solution)]
+                sampler.set_path(solution)
+                if info is not None and "first_solution_time" not in info:
+                    info["first_solution_time"] = time.time() - start_time
+                    info["first_solution_iteration"] = iterations
+                if renderer is not None:
+                    renderer.set_solution(solution, ellipse)
+                if on_solution is not None and on_solution(solution_record(tree, best_solution, iterations, time.time() - start_time)):
+                    stopped = True
+                    break
+            if renderer is not None:
+                renderer.show()
+
+    if info is not None:
+        info["iterations"] = iterations
+        info["batches"] = batches
+        info["edge_checks"] = search.edge_count
+        info["rejected_samples"] = search.rejected_samples
+    return search.solutions.best()
+
+
+"""
+returns the ids of the nodes from the start to last_node
+"""
+def backtrack (tree:Tree, last_node):
+    return tree.path_to(last_node)
+
+
+if __name__ == "__main__":
+
+    # --- Simulation Setup -----------------------
+    X_MAX = mapping.X_MAX
+    Y_MAX = mapping.Y_MAX
+    start_time = time.time()
+    NUM_OF_ITERATIONS = 50000
+    START_POINT = (int(X_MAX/2 - 50), int(Y_MAX/2))
+    GOAL_POINT = (int(X_MAX/2 + 50),int (Y_MAX/2))
+    GOAL_RADIUS = 12
+    rewiring_radius = 25
+    cbest = .95
+    time_limit = 60
+    batch_size = 200
+    HEADLESS = False
+    FRAME_RATE = 10
+
+    color_map = mapping.draw_simple_map2()
+    occupancy_map = mapping.get_occupancy_map(color_map)
+
+    if( not occupancy_map.point_is_free(START_POINT)):
+        print("invalid starting point")
+        exit()
+
+    if( not occupancy_map.point_is_free(GOAL_POINT)):
+        print("invalid goal point")
+        exit()
+
+    explored_nodes_tree = Tree()
+    starting_node = explored_nodes_tree.add_node(START_POINT, 0)
+    node_index = spatial_index.create_spatial_index(backend="grid", cell_size=rewiring_radius)
+    node_index.insert(START_POINT, starting_node)
+
+    if HEADLESS:
+        renderer = None
+    else:
+        renderer = TreeRenderer(color_map, 'BIT* Algorithm', GOAL_POINT, GOAL_RADIUS, FRAME_RATE)
+
+    # --- Run the algorithm ---------------------------
+    solution = explore(occupancy_map= occupancy_map, \
+                       tree= explored_nodes_tree, \
+                       node_index= node_index, \
+                       start_point=START_POINT,\
+                       goal_point=GOAL_POINT,\
+                       goal_radius=GOAL_RADIUS, \
+                       num_of_iterations= NUM_OF_ITERATIONS, \
+                       rewiring_radius= rewiring_radius, \
+                       cbest= cbest, \
+                       time_limit= time_limit, \
+                       batch_size= batch_size, \
+                       renderer= renderer)
+    if solution is not None:
+        solution = backtrack(tree= explored_nodes_tree, last_node= solution)
+    else:
+        print("Solution not found after " + str(NUM_OF_ITERATIONS) + " points checked!")
+        exit()
+    end_time = time.time()
+    cost_min = distance(START_POINT, GOAL_POINT)
+    cost_max = explored_nodes_tree.c2c[solution[-1]] + distance(GOAL_POINT, explored_nodes_tree.coordinates(solution[-1]))
+    print("cost min:", cost_min)
+    print("cost_max:", cost_max)
+    print("cbest:", cost_min/cost_max)
+    print("Solution found after (seconds):", (end_time - start_time))
+
+    #--- Display results ----------------------------
+
+    print()
+    print("Done!")
+
+    if renderer is not None:
+        renderer.set_solution([explored_nodes_tree.coordinates(i) for i in solution], None)
+        renderer.show(force=True, wait=0)
+
+    print("Explored_nodes_matrix:", len(explored_nodes_tree))
+    print()
@@ -0,0 +1,172 @@
+# lazy.py
+"""
+Search loop and building blocks of the lazy variants of RRT* and informed RRT* (explore_lazy in
+rrt_star.py and informed_rrt_star.py, which only pass in how they draw their points).
+
+The lazy planners add nodes and rewire edges optimistically, without checking them against the
+map. Edges are only checked once they are on the best solution: validate_solution walks the path
+to the best goal node, checks the edges that have not been checked yet, and repairs the tree
+around the first edge that is blocked. Most edges of the tree never end up on a solution, so they
+are never checked.
+
+checked is the set of ids of the nodes whose edge to their parent has been checked and is free.
+"""
+import heapq
+import math
+import time
+from tree import Tree, SolutionHeap, solution_record
+
+
+"""
+adds pt to the tree below the neighbor that gives it the lowest c2c, without checking the edge.
+Detached neighbors (infinite c2c) are skipped. Returns the id of the new node, or None if no
+neighbor can be its parent.
+"""
+def create_new_node(tree:Tree, pt, nodes_in_neightborhood):
+    best_c2c = math.inf
+    best_neighbor = None
+    for parent_node in nodes_in_neightborhood:
+        c2c = math.dist(pt, tree.coordinates(parent_node)) + float(tree.c2c[parent_node])
+        if c2c < best_c2c:
+            best_c2c = c2c
+            best_neighbor = parent_node
+    if best_neighbor is None:
+        return None
+    return tree.add_node(pt, best_c2c, best_neighbor)
+
+
+"""
+rewires the neighbors of a new node through it when that lowers their c2c, without checking the
+new edges. Returns the ids of the rewired neighbors.
+"""
+def update_neighborhood(tree:Tree, new_node, nodes_in_neightborhood, solutions:SolutionHeap, checked:set):
+    new_coordinates = tree.coordinates(new_node)
+    rewired = []
+    for node in nodes_in_neightborhood:
+        tempC2C = math.dist(new_coordinates, tree.coordinates(node)) + tree.c2c[new_node]
+        if tempC2C < tree.c2c[node]:
+            solutions.update(tree.rewire(node, new_node, tempC2C))
+            checked.discard(node)
+            rewired.append(node)
+    return rewired
+
+
+"""
+the edge from node to its parent is blocked. Finds node the cheapest parent in its neighborhood
+that is reachable through a free edge and is not one of its descendants. If there is none the
+subtree of node is detached from the tree until a later sample rewires it.
+Returns True if node was given a new parent.
+"""
+def repair(occupancy_map, tree:Tree, node, node_index, rewiring_radius, solutions:SolutionHeap, checked:set):
+    descendants = set(tree.subtree(node))
+    coordinates = tree.coordinates(node)
+    candidates = []
+    for neighbor in node_index.radius(coordinates, rewiring_radius):
+        if neighbor in descendants or neighbor == tree.parent[node] or math.isinf(tree.c2c[neighbor]):
+            continue
+        c2c = math.dist(coordinates, tree.coordinates(neighbor)) + float(tree.c2c[neighbor])
+        heapq.heappush(candidates, (c2c, neighbor))
+    while candidates:
+        c2c, parent = heapq.heappop(candidates)
+        if occupancy_map.path_is_free(coordinates, tree.coordinates(parent)):
+            solutions.update(tree.rewire(node, parent, c2c))
+            checked.add(node)
+            return True
+    tree.detach(node)
+    checked.discard(node)
+    return False
+
+
+"""
+checks the edges on the path to the best goal node and repairs the tree until the best goal node
+is reached through checked edges only. Returns its id, or None if no goal node is connected.
+
+info - dictionary - if given, "repairs" and "detached" count the blocked edges that were repaired
+                    and the ones whose subtree had to be detached
+"""
+def validate_solution(occupancy_map, tree:Tree, node_index, rewiring_radius, solutions:SolutionHeap, checked:set, info:dict=None):
+    while True:
+        goal_node = solutions.best()
+        if goal_node is None:
+            return None
+        for node in tree.path_to(goal_node)[1:]:
+            if node in checked:
+                continue
+            if occupancy_map.path_is_free(tree.coordinates(node), tree.parent_coordinates(node)):
+                checked.add(node)
+                continue
+            repaired = repair(occupancy_map, tree, node, node_index, rewiring_radius, solutions, checked)
+            if info is not None:
+                key = "repairs" if repaired else "detached"
+                info[key] = info.get(key, 0) + 1
+            break
+        else:
+            return goal_node
+
+
+"""
+search loop of the lazy planners. Every iteration draws a point with sample(best_solution), which
+returns None to stop the search, adds it to the tree below the cheapest neighbor with
+create_new_node and rewires its neighborhood with update_neighborhood. Every time the best
+solution improves its edges are checked with validate_solution, and they are checked once more
+before it is returned.
+
+sample - function of the id of the current best goal node (None before the first solution) that
+         returns the next point, this is the only step in which the lazy planners differ
+sampler - sampler of the planner, it is given the path of every better solution with set_path
+stop - threading.Event, the search stops once it is set
+Returns the id of the best goal node, or None. info is filled like by the explore functions, and
+also with "repairs" and "detached".
+"""
+def explore(occupancy_map, tree:Tree, node_index, goal_point:tuple, goal_radius, num_of_iterations:int, rewiring_radius,
+            time_limit, sample, sampler, info:dict=None, on_solution=None, stop=None):
+    solutions = SolutionHeap(tree)
+    checked = set()
+    start_time = time.time()
+    iterations = 0
+    rejected_samples = 0
+    best_solution = None
+    best_cost = float('inf')
+    # cost of the last solution passed to on_solution, repairs can make the best solution worse
+    reported_cost = float('inf')
+
+    for i in range(0, num_of_iterations):
+        if time.time() - start_time >= time_limit or (stop is not None and stop.is_set()):
+            break  # time limit reached, break out of the loop
+        iterations = i + 1
+        new_pt = sample(best_solution)
+        if new_pt is None:
+            break
+        new_node = None
+        if tree.find(new_pt) is None:
+            if occupancy_map.point_is_free(new_pt):
+                nodes_in_neighborhood = node_index.radius(new_pt, rewiring_radius)
+                new_node = create_new_node(tree, new_pt, nodes_in_neighborhood)
+                if new_node is not None:
+                    node_index.insert(new_pt, new_node)
+                    update_neighborhood(tree, new_node, nodes_in_neighborhood, solutions, checked)
+                    if math.dist(new_pt, goal_point) < goal_radius:
+                        solutions.add(new_node)
+
+                    candidate = solutions.best()
+                    if candidate is not None and (candidate != best_solution or tree.c2c[candidate] < best_cost):
+                        best_solution = validate_solution(occupancy_map, tree, node_index, rewiring_radius, solutions, checked, info)
+                        if best_solution is not None:
+                            best_cost = tree.c2c[best_solution]
+                            sampler.set_path([tree.coordinates(node) for node in tree.path_to(best_solution)])
+                            if info is not None and "first_solution_time" not in info:
+                                info["first_solution_time"] = time.time() - start_time
+                                info["first_solution_iteration"] = iterations
+                            if on_solution is not None and best_cost < reported_cost:
+                                reported_cost = best_cost
+                                if on_solution(solution_record(tree, best_solution, iterations, time.time() - start_time)):
+                                    break
+                        else:
+                            best_cost = float('inf')
+        if new_node is None:
+            rejected_samples += 1
+    best_solution = validate_solution(occupancy_map, tree, node_index, rewiring_radius, solutions, checked, info)
+    if info is not None:
+        info["iterations"] = iterations
+        info["rejected_samples"] = rejected_samples
+    return best_solution
@@ -1,6 +1,11 @@
 import numpy as np
 import cv2 as cv
 import random
+import hashlib
+import math
+import os
+from collections import OrderedDict
+from occupancy_pyramid import OccupancyPyramid
 
 
 # map dimensions
@@ -132,7 +137,7 @@ coordinates: set of xy coordinates [x, y]
 
 """
 def point_is_valid(color_map, coordinates):
-    if not __point_is_inside_map(coordinates[X], coordinates[Y]):
+    if not __point_is_inside_map(color_map, coordinates[X], coordinates[Y]):
         return False
     pixel_color = tuple(color_map[coordinates[Y], coordinates[X]])
     if pixel_color == WHITE:
@@ -143,10 +148,487 @@ def point_is_valid(color_map, coordinates):
         raise Exception("determine_valid_point was passed an invalid argument")
 
 
-def __point_is_inside_map(x, y):
-    if (x > X_MAX_SCALED) or (x < 0):
+"""
+create_occupancy_grid
+
+Converts a color map into a compact occupancy grid. This only needs to be done once per map.
+
+color_map: numpy_array of a color map. map is 3 dimensions [y, x, [color]]
+
+returns a 2 dimensional numpy array of bools [y, x] that is True where the map is free space
+"""
+def create_occupancy_grid(color_map):
+    free_space = np.all(color_map == WHITE, axis=2)
+    obstacle_space = np.all(color_map == BLACK, axis=2)
+    if not np.all(free_space | obstacle_space):
+        raise Exception("create_occupancy_grid was passed a map with colors other than WHITE and BLACK")
+    return free_space
+
+
+"""
+pack_occupancy_grid / unpack_occupancy_grid
+
+Stores an occupancy grid with one bit per cell. The packed grid is 8 times smaller than the
+bool grid and 24 times smaller than the color map. It can be queried with point_is_free_packed
+without unpacking it.
+"""
+def pack_occupancy_grid(occupancy_grid):
+    return np.packbits(occupancy_grid, axis=1)
+
+
+def unpack_occupancy_grid(packed_grid, x_dim_len):
+    return np.unpackbits(packed_grid, axis=1, count=x_dim_len).astype(bool)
+
+
+"""
+point_is_free
+
+Determines if a given set of coordinates is in free space using an occupancy grid
+
+occupancy_grid: numpy_array of bools [y, x] from create_occupancy_grid
+coordinates:    set of xy coordinates [x, y]
+"""
+def point_is_free(occupancy_grid, coordinates):
+    x, y = coordinates[X], coordinates[Y]
+    if x < 0 or y < 0 or y >= occupancy_grid.shape[0] or x >= occupancy_grid.shape[1]:
+        return False
+    return bool(occupancy_grid[y, x])
+
+
+def point_is_free_packed(packed_grid, coordinates):
+    x, y = coordinates[X], coordinates[Y]
+    if x < 0 or y < 0 or y >= packed_grid.shape[0] or (x >> 3) >= packed_grid.shape[1]:
+        return False
+    return bool((packed_grid[y, x >> 3] >> (7 - (x & 7))) & 1)
+
+
+"""
+    Returns a list of coordinates between two points (x1, y1) and (x2, y2) using Bresenham's line algorithm.
+"""
+def get_line_coordinates(p1, p2):
+    
+    x1, y1, x2, y2 = p1[0], p1[1], p2[0], p2[1]
+    coordinates = []
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+    sx = -1 if x1 > x2 else 1
+    sy = -1 if y1 > y2 else 1
+    err = dx - dy
+    while x1 != x2 or y1 != y2:
+        coordinates.append((x1, y1))
+        e2 = 2 * err
+        if e2 > -dy:
+            err -= dy
+            x1 += sx
+        if e2 < dx:
+            err += dx
+            y1 += sy
+    coordinates.append((x2, y2))
+    return coordinates
+
+
+"""
+vectorized get_line_coordinates of k lines at once, from starts[i] to ends[i]. Bresenham's
+algorithm steps along the major axis one cell at a time, and the cell it picks on the minor axis at
+step t has the closed form (2 * t * minor + major - 1) // (2 * major), so every cell of every line
+is computed in one numpy operation and is the same cell get_line_coordinates draws.
+
+starts, ends: numpy_arrays of ints [k, (x, y)]
+returns numpy_arrays (lines, x, y) with one entry per cell, lines[j] is the index of the line of cell j
+"""
+def get_line_coordinates_batch(starts, ends):
+    x1, y1 = starts[:, X], starts[:, Y]
+    dx = np.abs(ends[:, X] - x1)
+    dy = np.abs(ends[:, Y] - y1)
+    sx = np.where(ends[:, X] < x1, -1, 1)
+    sy = np.where(ends[:, Y] < y1, -1, 1)
+    major = np.maximum(dx, dy)
+    minor = np.minimum(dx, dy)
+    lengths = major + 1
+    lines = np.repeat(np.arange(len(starts)), lengths)
+    # step of every cell along the major axis of its line
+    steps = np.arange(len(lines)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    major = major[lines]
+    minor_steps = (2 * steps * minor[lines] + major - 1) // np.maximum(2 * major, 1)
+    x_major = (dx >= dy)[lines]
+    x = x1[lines] + sx[lines] * np.where(x_major, steps, minor_steps)
+    y = y1[lines] + sy[lines] * np.where(x_major, minor_steps, steps)
+    return lines, x, y
+
+
+"""
+OccupancyMap
+
+Everything the planners need to know about a map, computed once and shared by every query on it.
+
+grid:       numpy_array of bools [y, x] from create_occupancy_grid or load_occupancy_grid, True
+            in free space. It can be memory-mapped
+x_dim_len:  width of the map
+y_dim_len:  height of the map
+free_cells: flat indices (y * x_dim_len + x) of every free cell, built the first time it is used.
+            Maps larger than FREE_CELLS_LIMIT cells are sampled without it, see random_free_points
+blocked_cells: flat indices of every obstacle cell, built the first time it is used. Only used on
+            maps of up to FREE_CELLS_LIMIT cells, by sampling.ObstacleSampler
+clearance:  numpy_array of float32 [y, x] with the distance from every cell to the closest
+            obstacle cell (0 in obstacles), built the first time it is used
+pyramid:    OccupancyPyramid of the grid, built the first time it is used
+edge_cache: EdgeCache of the results of path_is_free. The map never changes, so the results stay
+            valid for every query planned on it
+
+collision_checker: how path_is_free checks the lines that are not in the cache:
+    "clearance" - jumps along the line through the clearance field, 4 bytes per cell
+    "pyramid"   - descends the pyramid into the blocks near the line that hold obstacles, a third
+                  of a byte per cell. Faster for long lines on large maps
+    None picks "clearance" for maps of up to FREE_CELLS_LIMIT cells and "pyramid" for larger ones
+batch_min_lines: fewest lines that are checked with one call of paths_are_free, see BATCH_MIN_LINES
+
+clearance can also be passed in when it was computed before, for example by another process (see
+parallel.SharedMap)
+"""
+class OccupancyMap:
+    # a cell on the line drawn by get_line_coordinates is at most this far from the exact line
+    LINE_TOLERANCE = 0.75
+    FREE_CELLS_LIMIT = 2 ** 24
+    # fewest lines that the planners check with one call of paths_are_free, for each collision
+    # checker. A line costs a few microseconds with the clearance field, about as much as a numpy
+    # call, so short lists of lines are faster to check one by one
+    BATCH_MIN_LINES = {"clearance": 24, "pyramid": 4}
+
+    def __init__(self, occupancy_grid, edge_cache_size=200000, collision_checker=None, clearance=None):
+        # indexing a plain view of a numpy.memmap is much faster than indexing the memmap
+        self.grid = np.asarray(occupancy_grid)
+        self.y_dim_len = occupancy_grid.shape[0]
+        self.x_dim_len = occupancy_grid.shape[1]
+        self._free_cells = None
+        self._blocked_cells = None
+        self._clearance = clearance
+        self._pyramid = None
+        self.edge_cache = EdgeCache(edge_cache_size)
+        if collision_checker is None:
+            collision_checker = "clearance" if self.grid.size <= self.FREE_CELLS_LIMIT else "pyramid"
+        if collision_checker not in ("clearance", "pyramid"):
+            raise Exception("OccupancyMap was passed an unknown collision checker: " + str(collision_checker))
+        self.collision_checker = collision_checker
+        self.batch_min_lines = self.BATCH_MIN_LINES[collision_checker]
+
+    @property
+    def free_cells(self):
+        if self._free_cells is None:
+            self._free_cells = np.flatnonzero(self.grid)
+        return self._free_cells
+
+    @property
+    def blocked_cells(self):
+        if self._blocked_cells is None:
+            self._blocked_cells = np.flatnonzero(~self.grid)
+        return self._blocked_cells
+
+    """
+    returns the x and y coordinates of up to n random free cells. Small maps are sampled from
+    free_cells, large ones by drawing n cells over the whole map and keeping the free ones.
+    """
+    def random_free_points(self, n, rng):
+        if self.grid.size <= self.FREE_CELLS_LIMIT:
+            free_cells = self.free_cells
+            y_points, x_points = np.divmod(free_cells[rng.integers(0, len(free_cells), n)], self.x_dim_len)
+            return x_points, y_points
+        x_points = rng.integers(0, self.x_dim_len, n)
+        y_points = rng.integers(0, self.y_dim_len, n)
+        free = self.grid[y_points, x_points]
+        return x_points[free], y_points[free]
+
+    @property
+    def clearance(self):
+        if self._clearance is None:
+            self._clearance = cv.distanceTransform(self.grid.view(np.uint8), cv.DIST_L2, cv.DIST_MASK_PRECISE)
+        return self._clearance
+
+    @property
+    def pyramid(self):
+        if self._pyramid is None:
+            self._pyramid = OccupancyPyramid(self.grid)
+        return self._pyramid
+
+    def point_is_free(self, coordinates):
+        return point_is_free(self.grid, coordinates)
+
+    """
+    checks if the line between pt1 and pt2 is in free space, looking the edge up in edge_cache first.
+    The pixels of a line depend on the end point it is drawn from, so the line is always drawn from
+    the lower end point of the key, which makes the result independent of the order of pt1 and pt2.
+    """
+    def path_is_free(self, pt1, pt2):
+        # a zero length edge (rrt.explore resampling an existing node) is just its point, it is not cached
+        if pt1[0] == pt2[0] and pt1[1] == pt2[1]:
+            return self.point_is_free(pt1)
+        key = EdgeCache.key(pt1, pt2)
+        result = self.edge_cache.get(key)
+        if result is None:
+            result = self.path_is_free_uncached(key[:2], key[2:])
+            self.edge_cache.put(key, result)
+        return result
+
+    """
+    batch version of path_is_free for the lines from pt to each of k end points, as used to choose
+    the parent of a new node and to rewire its neighborhood. The lines that are in edge_cache are
+    looked up, and all of the others are rasterized and checked against the grid in one numpy
+    operation by lines_are_free.
+
+    endpoints: sequence or numpy_array of k (x, y) points
+    returns a numpy_array of k bools, True where the line is free
+    """
+    def paths_are_free(self, pt, endpoints):
+        endpoints = np.asarray(endpoints, np.int64).reshape(-1, 2)
+        keys = [EdgeCache.key(pt, end_point) for end_point in endpoints.tolist()]
+        results = [self.edge_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = self.lines_are_free(pt, endpoints[missing]).tolist()
+            for i, result in zip(missing, computed):
+                results[i] = result
+                self.edge_cache.put(keys[i], result)
+        return np.array(results, np.bool_)
+
+    """
+    checks the lines from pt to each of k end points pixel by pixel, giving the same answers as
+    path_is_free_exact. Like path_is_free, every line is drawn from the lower of its two end points.
+    """
+    def lines_are_free(self, pt, endpoints):
+        endpoints = np.asarray(endpoints, np.int64).reshape(-1, 2)
+        free = np.zeros(len(endpoints), np.bool_)
+        if len(endpoints) == 0 or not self.point_is_free(pt):
+            return free
+        inside = (endpoints[:, X] >= 0) & (endpoints[:, X] < self.x_dim_len) & \
+                 (endpoints[:, Y] >= 0) & (endpoints[:, Y] < self.y_dim_len)
+        free[inside] = self.grid[endpoints[inside, Y], endpoints[inside, X]]
+        candidates = np.flatnonzero(free)
+        ends = endpoints[candidates]
+        start = np.array(pt, np.int64)
+        if self.collision_checker == "clearance":
+            # the lines shorter than the clearance of one of their end points are free, as in path_is_free_uncached
+            clearance = self.clearance
+            margin = 2 * self.LINE_TOLERANCE
+            lengths = np.hypot(ends[:, X] - start[X], ends[:, Y] - start[Y])
+            clear = (clearance[ends[:, Y], ends[:, X]] - margin > lengths) | \
+                    (clearance[start[Y], start[X]] - margin > lengths) | (lengths == 0)
+            candidates = candidates[~clear]
+            ends = ends[~clear]
+            if len(candidates) == 0:
+                return free
+        # the line is drawn from the lower end point (in the order of EdgeCache.key)
+        swap = (ends[:, X] < start[X]) | ((ends[:, X] == start[X]) & (ends[:, Y] < start[Y]))
+        starts = np.where(swap[:, None], ends, start)
+        ends = np.where(swap[:, None], start, ends)
+        # every cell of a line is inside the bounding box of its end points, so inside the map
+        lines, x, y = get_line_coordinates_batch(starts, ends)
+        blocked = np.bincount(lines[~self.grid[y, x]], minlength=len(candidates))
+        free[candidates] = blocked == 0
+        return free
+
+    """
+    checks if the line between pt1 and pt2 is in free space, giving the same answer as
+    path_is_free_exact. With the "pyramid" collision checker see OccupancyPyramid.segment_is_free.
+    With the "clearance" one, every cell closer than clearance to a cell is free, so:
+     - the line is free if the clearance of an end point is larger than the length of the line
+     - otherwise the line is walked in jumps as long as the clearance of the current point
+    Only when the line gets close to an obstacle are its pixels checked one by one.
+    A line and its reverse can go through different cells, so the line is always drawn from the
+    lower end point (in the order of EdgeCache.key) and the answer does not depend on the order of
+    pt1 and pt2, like the cached answer of the edge.
+    """
+    def path_is_free_uncached(self, pt1, pt2):
+        if (pt2[0], pt2[1]) < (pt1[0], pt1[1]):
+            pt1, pt2 = pt2, pt1
+        if not (self.point_is_free(pt1) and self.point_is_free(pt2)):
+            return False
+        length = math.dist(pt1, pt2)
+        # both end points are free, and a zero length line has no direction to walk along
+        if length == 0:
+            return True
+        if self.collision_checker == "pyramid":
+            result = self.pyramid.segment_is_free(pt1, pt2)
+            return self.path_is_free_exact(pt1, pt2) if result is None else result
+        clearance = self.clearance
+        # a cell of the line can be LINE_TOLERANCE away from the exact line, and so can the cell
+        # whose clearance is used
+        margin = 2 * self.LINE_TOLERANCE
+        if clearance[pt1[1], pt1[0]] - margin > length or clearance[pt2[1], pt2[0]] - margin > length:
+            return True
+
+        x1, y1 = pt1[0], pt1[1]
+        dx, dy = (pt2[0] - x1) / length, (pt2[1] - y1) / length
+        travelled = 0.0
+        while travelled < length:
+            step = clearance[round(y1 + dy * travelled), round(x1 + dx * travelled)] - margin
+            if step < 1:
+                return self.path_is_free_exact(pt1, pt2)
+            travelled += step
+        return True
+
+    """
+    checks every pixel of the line between pt1 and pt2
+    """
+    def path_is_free_exact(self, pt1, pt2):
+        grid = self.grid
+        for x, y in get_line_coordinates(pt1, pt2):
+            if x < 0 or y < 0 or y >= self.y_dim_len or x >= self.x_dim_len or not grid[y, x]:
+                return False
+        return True
+
+
+"""
+EdgeCache
+
+Least recently used cache of edge validity results. Edges are keyed on the unordered pair of
+their end points, so (pt1, pt2) and (pt2, pt1) share an entry. When more than max_size edges are
+stored the least recently used one is evicted. max_size 0 disables the cache.
+
+hits, misses and evictions count the lookups since the cache was created or reset.
+"""
+class EdgeCache:
+    def __init__(self, max_size=200000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def key(pt1, pt2):
+        if (pt1[0], pt1[1]) <= (pt2[0], pt2[1]):
+            return (pt1[0], pt1[1], pt2[0], pt2[1])
+        return (pt2[0], pt2[1], pt1[0], pt1[1])
+
+    """
+    returns the stored result of the edge, or None if it is not in the cache
+    """
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key, result):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = result
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# number of OccupancyMaps get_occupancy_map keeps, every one holds its preprocessing and EdgeCache
+OCCUPANCY_MAP_CACHE_SIZE = 8
+_occupancy_map_cache = OrderedDict()
+
+"""
+get_occupancy_map
+
+Returns the OccupancyMap of a color map. Maps are cached by content, so calling this again with
+the same map (even a copy of it) returns the already preprocessed OccupancyMap. Only the
+OCCUPANCY_MAP_CACHE_SIZE most recently used maps are kept.
+
+color_map: numpy_array of a color map. map is 3 dimensions [y, x, [color]]
+cache:     look the map up in the cache and add it to it. If False a new OccupancyMap is returned
+           and nothing is kept
+"""
+def get_occupancy_map(color_map, cache=True):
+    if not cache:
+        return OccupancyMap(create_occupancy_grid(color_map))
+    key = (color_map.shape, hashlib.sha1(np.ascontiguousarray(color_map).data).hexdigest())
+    occupancy_map = _occupancy_map_cache.get(key)
+    if occupancy_map is None:
+        occupancy_map = OccupancyMap(create_occupancy_grid(color_map))
+        _occupancy_map_cache[key] = occupancy_map
+        if len(_occupancy_map_cache) > OCCUPANCY_MAP_CACHE_SIZE:
+            _occupancy_map_cache.popitem(last=False)
+    else:
+        _occupancy_map_cache.move_to_end(key)
+    return occupancy_map
+
+
+"""
+load_occupancy_grid
+
+Loads the occupancy grid of a map file without creating a color copy of the map.
+    .npy          - grid saved with save_occupancy_grid (bools, True in free space), or any 2
+                    dimensional array where nonzero is free space
+    .raw / .bin   - one byte per cell in row order, nonzero is free space. shape (y_dim_len,
+                    x_dim_len) has to be given
+    anything else - image read by OpenCV in grayscale, cells brighter than threshold are free space
+bool .npy files and raw files with only 0 and 1 bytes are memory-mapped, so only the parts of
+the map that are used are read. Everything else is converted to bools in memory, save it with
+save_occupancy_grid to memory-map it the next time.
+
+path:      path of the map file
+shape:     tuple - (y_dim_len, x_dim_len) of raw files
+threshold: gray level above which a cell of an image or a raw file is free
+"""
+def load_occupancy_grid(path, shape=None, threshold=127):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        grid = np.load(path, mmap_mode="r")
+        if grid.ndim != 2:
+            raise Exception("load_occupancy_grid was passed a .npy file that is not 2 dimensional: " + path)
+        if grid.dtype == np.bool_:
+            return grid
+        return np.asarray(grid) > 0
+    if extension in (".raw", ".bin"):
+        if shape is None:
+            raise Exception("load_occupancy_grid needs the shape of raw map files")
+        raw = np.memmap(path, dtype=np.uint8, mode="r", shape=tuple(shape))
+        if raw.max() <= 1:
+            return raw.view(np.bool_)
+        return raw > threshold
+    image = cv.imread(path, cv.IMREAD_GRAYSCALE)
+    if image is None:
+        raise Exception("load_occupancy_grid could not read the map file: " + path)
+    return image > threshold
+
+
+def save_occupancy_grid(occupancy_grid, path):
+    np.save(path, np.asarray(occupancy_grid, np.bool_))
+
+
+_map_file_cache = {}
+
+"""
+load_occupancy_map
+
+Returns the OccupancyMap of a map file, see load_occupancy_grid. Files are cached by path and
+modification time, so every planner of the process shares the map.
+"""
+def load_occupancy_map(path, shape=None, threshold=127):
+    key = (os.path.abspath(path), os.path.getmtime(path), shape, threshold)
+    if key not in _map_file_cache:
+        _map_file_cache[key] = OccupancyMap(load_occupancy_grid(path, shape, threshold))
+    return _map_file_cache[key]
+
+
+def __point_is_inside_map(color_map, x, y):
+    if (x >= color_map.shape[1]) or (x < 0):
         return False
-    elif (y > Y_MAX_SCALED) or (y < 0):
+    elif (y >= color_map.shape[0]) or (y < 0):
         return False
     else:
         return True
@@ -0,0 +1,114 @@
+# occupancy_pyramid.py
+import numpy as np
+
+
+FREE = 0
+MIXED = 1
+BLOCKED = 2
+
+
+"""
+returns the part [t0, t1] of the segment pt1 + t * (pt2 - pt1), t in [0, 1], that is inside the
+box [x_min, x_max] x [y_min, y_max], or None if the segment misses the box (Liang-Barsky)
+"""
+def clip_segment(pt1, pt2, x_min, y_min, x_max, y_max):
+    t0, t1 = 0.0, 1.0
+    dx = pt2[0] - pt1[0]
+    dy = pt2[1] - pt1[1]
+    for p, q in ((-dx, pt1[0] - x_min), (dx, x_max - pt1[0]), (-dy, pt1[1] - y_min), (dy, y_max - pt1[1])):
+        if p == 0:
+            if q < 0:
+                return None
+        else:
+            t = q / p
+            if p < 0:
+                if t > t1:
+                    return None
+                if t > t0:
+                    t0 = t
+            else:
+                if t < t0:
+                    return None
+                if t < t1:
+                    t1 = t
+    return t0, t1
+
+
+"""
+OccupancyPyramid
+
+Multi-resolution occupancy of a map. Level k splits the map into blocks of 2^k x 2^k cells and
+stores for every block whether it is FREE (no obstacle cell), BLOCKED (only obstacle cells) or
+MIXED. Level 0 is the occupancy grid itself and the top level is a single block, so all of the
+levels together take a third of the memory of the grid.
+
+segment_is_free starts at the top level and only descends into the MIXED blocks that the segment
+passes through, so its cost grows with the number of obstacles near the segment instead of its
+length in pixels.
+
+occupancy_grid: numpy_array of bools [y, x], True in free space
+"""
+class OccupancyPyramid:
+    def __init__(self, occupancy_grid):
+        self.grid = occupancy_grid
+        # level 0 is read from the grid
+        self.levels = [None]
+        free = np.asarray(occupancy_grid, np.bool_)
+        blocked = ~free
+        while free.shape[0] > 1 or free.shape[1] > 1:
+            if free.shape[0] % 2 or free.shape[1] % 2:
+                # cells outside the map are never on a segment, pad with free cells so they do not make a block MIXED
+                padding = ((0, free.shape[0] % 2), (0, free.shape[1] % 2))
+                free = np.pad(free, padding, constant_values=True)
+                blocked = np.pad(blocked, padding, constant_values=False)
+            free = free[0::2, 0::2] & free[1::2, 0::2] & free[0::2, 1::2] & free[1::2, 1::2]
+            blocked = blocked[0::2, 0::2] & blocked[1::2, 0::2] & blocked[0::2, 1::2] & blocked[1::2, 1::2]
+            level = np.full(free.shape, MIXED, np.uint8)
+            level[free] = FREE
+            level[blocked] = BLOCKED
+            self.levels.append(level)
+
+    @property
+    def num_of_levels(self):
+        return len(self.levels)
+
+    """
+    checks the cells that a line drawn with mapping.get_line_coordinates from pt1 to pt2 goes
+    through. Every cell of such a line is less than half a cell (across the line) away from the
+    segment, so:
+     - a block is skipped when the segment does not pass within half a cell of it
+     - the line is free when every block that the segment passes near is FREE
+     - the line is blocked when the segment passes more than one cell deep into a BLOCKED block
+    Returns True or False, or None when a cell near the segment is an obstacle but the line may
+    still miss it, and the cells of the line have to be checked one by one.
+    """
+    def segment_is_free(self, pt1, pt2):
+        undecided = False
+        stack = [(len(self.levels) - 1, 0, 0)]
+        while stack:
+            level, block_x, block_y = stack.pop()
+            size = 1 << level
+            x_min = block_x * size
+            y_min = block_y * size
+            x_max = x_min + size - 1
+            y_max = y_min + size - 1
+            # cell centers are at integer coordinates
+            clipped = clip_segment(pt1, pt2, x_min - .5, y_min - .5, x_max + .5, y_max + .5)
+            if clipped is None:
+                continue
+            state = FREE if level == 0 and self.grid[block_y, block_x] else \
+                BLOCKED if level == 0 else self.levels[level][block_y, block_x]
+            if state == FREE:
+                continue
+            if state == BLOCKED:
+                if size > 2 and clip_segment(pt1, pt2, x_min + 1, y_min + 1, x_max - 1, y_max - 1) is not None:
+                    return False
+                undecided = True
+                continue
+            level -= 1
+            levels = self.levels[level] if level > 0 else self.grid
+            for child_x in (2 * block_x, 2 * block_x + 1):
+                for child_y in (2 * block_y, 2 * block_y + 1):
+                    if child_y < levels.shape[0] and child_x < levels.shape[1]:
+                        stack.append((level, child_x, child_y))
+        return None if undecided else True
@@ -0,0 +1,317 @@
+# parallel.py
+"""
+Parallel planning of one query by a pool of processes.
+
+Every worker process runs its own RRT* or informed RRT* tree on the query with its own seed. The
+occupancy grid (and the clearance field) are put in shared memory once, and the workers map them
+instead of receiving a pickled copy of the map with every query. The workers exchange their best
+costs through a shared value: every better solution lowers it, and the informed RRT* workers sample
+inside the ellipse of the best solution of all of the workers (see sampling.SharedCostSampler), so
+each of them only adds nodes that can still beat the best path found so far.
+
+The workers report every better solution to the parent as soon as they find it. At the deadline
+the parent returns the best of them, without waiting for the workers to finish their iteration, and
+tells the workers to stop the query. A worker that is still running it afterwards can not change
+the shared cost of the next query (see QueryCost).
+
+    with ParallelPlanner(mapping.draw_simple_map2(), workers=8, seed=0) as planner:
+        result = planner.plan(start_point, goal_point, deadline=1.0)
+"""
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import mapping
+from planner import Planner, PlanResult
+from tree import path_tree
+
+
+PARALLEL_ALGORITHMS = ("rrt_star", "informed_rrt_star")
+
+
+"""
+SharedMap
+
+Copies the grid of an occupancy map, and its clearance field when the map uses the "clearance"
+collision checker, to shared memory. The pyramid of the "pyramid" collision checker is built by
+every worker that needs it. close() frees the shared memory, the maps attached to it can not be
+used afterwards.
+
+occupancy_map: mapping.OccupancyMap to share
+"""
+class SharedMap:
+    def __init__(self, occupancy_map):
+        self.collision_checker = occupancy_map.collision_checker
+        self.arrays = {"grid": occupancy_map.grid}
+        if self.collision_checker == "clearance":
+            self.arrays["clearance"] = occupancy_map.clearance
+        self.memories = {}
+        try:
+            for name, array in self.arrays.items():
+                memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                np.ndarray(array.shape, array.dtype, buffer=memory.buf)[:] = array
+                self.memories[name] = memory
+        except Exception:
+            self.close()
+            raise
+
+    """
+    returns what attach needs to map the arrays in another process, as a dictionary that can be
+    pickled
+    """
+    def description(self):
+        return {"collision_checker": self.collision_checker,
+                "arrays": {name: (self.memories[name].name, array.shape, array.dtype.str)
+                           for name, array in self.arrays.items()}}
+
+    """
+    returns a mapping.OccupancyMap of the arrays of description and the shared memory blocks it
+    reads from, which have to be kept open as long as the map is used
+    """
+    @staticmethod
+    def attach(description):
+        memories = {}
+        arrays = {}
+        for name, (memory_name, shape, dtype) in description["arrays"].items():
+            memories[name] = shared_memory.SharedMemory(name=memory_name)
+            arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=memories[name].buf)
+        occupancy_map = mapping.OccupancyMap(arrays["grid"], collision_checker=description["collision_checker"],
+                                             clearance=arrays.get("clearance"))
+        return occupancy_map, memories
+
+    def close(self):
+        for memory in self.memories.values():
+            memory.close()
+            memory.unlink()
+        self.memories = {}
+
+
+"""
+QueryCost
+
+The best cost of one query, used as the shared_cost of the Planner of a worker. shared_cost is the
+multiprocessing.Array of ParallelPlanner holding the id of the current query and its best cost.
+Once the parent moved on to another query, reading gives an infinite cost and writing does nothing.
+"""
+class QueryCost:
+    def __init__(self, shared_cost, query_id):
+        self.shared_cost = shared_cost
+        self.query_id = query_id
+
+    def get_lock(self):
+        return self.shared_cost.get_lock()
+
+    @property
+    def value(self):
+        with self.shared_cost.get_lock():
+            if self.shared_cost[0] != self.query_id:
+                return float('inf')
+            return self.shared_cost[1]
+
+    @value.setter
+    def value(self, cost):
+        with self.shared_cost.get_lock():
+            if self.shared_cost[0] == self.query_id:
+                self.shared_cost[1] = cost
+
+
+"""
+QueryStop
+
+The stop event of one query, passed to Planner.plan of a worker. It is set once stopped_query,
+the multiprocessing.Value of ParallelPlanner holding the id of the last query that ended, reaches
+query_id. The tasks of a pool can not carry a multiprocessing.Event, so all of the queries share
+that value.
+"""
+class QueryStop:
+    def __init__(self, stopped_query, query_id):
+        self.stopped_query = stopped_query
+        self.query_id = query_id
+
+    def is_set(self):
+        return self.stopped_query.value >= self.query_id
+
+
+# state of a worker process, set by init_worker
+worker = {}
+
+
+def init_worker(description, parameters, shared_cost, stopped_query, messages):
+    worker["occupancy_map"], worker["memories"] = SharedMap.attach(description)
+    worker["parameters"] = parameters
+    worker["shared_cost"] = shared_cost
+    worker["stopped_query"] = stopped_query
+    worker["messages"] = messages
+
+
+"""
+plans one query in a worker process. Every better solution is put on the message queue as
+("solution", query_id, tree.solution_record), and the end of the search as ("done", query_id,
+dictionary of the result) or ("error", query_id, exception)
+
+task: dictionary {"query_id", "start_point", "goal_point", "seed", "end_time"}
+"""
+def run_worker(task):
+    messages = worker["messages"]
+    query_id = task["query_id"]
+
+    def on_solution(solution):
+        messages.put(("solution", query_id, solution))
+        return False
+
+    try:
+        deadline = None
+        if task["end_time"] is not None:
+            deadline = max(task["end_time"] - time.time(), 0)
+        planner = Planner(worker["occupancy_map"], seed=task["seed"],
+                          shared_cost=QueryCost(worker["shared_cost"], query_id), **worker["parameters"])
+        result = planner.plan(task["start_point"], task["goal_point"], on_solution=on_solution, deadline=deadline,
+                              stop=QueryStop(worker["stopped_query"], query_id))
+        messages.put(("done", query_id, {"cost": result.cost,
+                                         "path": result.path,
+                                         "iterations": result.iterations,
+                                         "num_of_nodes": result.num_of_nodes,
+                                         "planning_time": result.planning_time}))
+    except Exception as e:
+        messages.put(("error", query_id, e))
+
+
+"""
+ParallelPlanner
+
+Plans every query with workers independent trees at once, one per process of a pool that is
+created with the planner and kept for all of its queries. Call close() (or use it in a with
+statement) to stop the pool and free the shared map.
+
+map_:       anything Planner accepts as a map
+workers:    number of worker processes, all of the cores if None
+algorithm:  "rrt_star" or "informed_rrt_star"
+seed:       seed of the random generator that draws the seeds of the workers, None for an
+            unseeded one. The results also depend on when the workers see each others costs, so
+            they are not reproducible
+parameters: the other parameters of Planner, used by every worker
+"""
+class ParallelPlanner:
+    def __init__(self, map_, workers=None, algorithm="informed_rrt_star", seed=None, **parameters):
+        if algorithm not in PARALLEL_ALGORITHMS:
+            raise Exception("ParallelPlanner was passed an algorithm it can not run in parallel: " + str(algorithm))
+        # checks the parameters and preprocesses the map
+        self.planner = Planner(map_, algorithm=algorithm, **parameters)
+        self.occupancy_map = self.planner.occupancy_map
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.rng = np.random.default_rng(seed)
+        self.query_id = 0
+        self.shared_map = SharedMap(self.occupancy_map)
+        # id of the current query and its best cost
+        self.shared_cost = multiprocessing.Array("d", [0, float('inf')])
+        # id of the last query that ended, its workers stop
+        self.stopped_query = multiprocessing.Value("q", 0)
+        self.messages = multiprocessing.Queue()
+        self.pool = multiprocessing.Pool(self.workers, initializer=init_worker,
+                                         initargs=(self.shared_map.description(), dict(parameters, algorithm=algorithm),
+                                                   self.shared_cost, self.stopped_query, self.messages))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+            self.shared_map.close()
+
+    """
+    start_point: tuple - (x, y)
+    goal_point:  tuple - (x, y)
+    on_solution: function called in this process with the tree.solution_record of every solution
+                 that is better than all of the solutions of the other workers. "iteration" is the
+                 iteration of the worker that found it and "elapsed" the seconds since plan was
+                 called. The planner returns the best solution so far if it returns True
+    deadline:    seconds after which the best solution so far is returned. Without it plan waits
+                 for every worker to finish its num_of_iterations or time_limit
+
+    returns a PlanResult with the best path of all of the workers. Its tree only holds the path, and
+    info has "iterations" (the sum over the workers that finished), "worker_costs" (the final cost of
+    every worker that finished) and "first_solution_time" if a solution was found
+    """
+    def plan(self, start_point, goal_point, on_solution=None, deadline=None):
+        if self.pool is None:
+            raise Exception("ParallelPlanner was used after it was closed")
+        if not self.occupancy_map.point_is_free(start_point):
+            raise Exception("invalid starting point")
+        if not self.occupancy_map.point_is_free(goal_point):
+            raise Exception("invalid goal point")
+
+        self.query_id += 1
+        with self.shared_cost.get_lock():
+            self.shared_cost[0] = self.query_id
+            self.shared_cost[1] = float('inf')
+        start_time = time.time()
+        end_time = None if deadline is None else start_time + deadline
+        seeds = self.rng.integers(0, 2 ** 63, self.workers)
+        best = None
+        info = {"iterations": 0, "worker_costs": []}
+        try:
+            self.pool.map_async(run_worker, [{"query_id": self.query_id,
+                                              "start_point": start_point,
+                                              "goal_point": goal_point,
+                                              "seed": int(seed),
+                                              "end_time": end_time} for seed in seeds])
+
+            finished = 0
+            while finished < self.workers:
+                timeout = None if end_time is None else end_time - time.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    kind, query_id, content = self.messages.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                # workers that were still stopping an earlier query report late
+                if query_id != self.query_id:
+                    continue
+                if kind == "error":
+                    raise content
+                if kind == "done":
+                    finished += 1
+                    info["iterations"] += content["iterations"]
+                    info["worker_costs"].append(content["cost"])
+                    # a worker can end with a better path than it reported, for example after rewiring
+                    if content["path"] and (best is None or content["cost"] < best["cost"]):
+                        best = {"cost": content["cost"], "path": content["path"],
+                                "iteration": content["iterations"], "elapsed": time.time() - start_time}
+                    continue
+                if best is None or content["cost"] < best["cost"]:
+                    best = dict(content, elapsed=time.time() - start_time)
+                    info.setdefault("first_solution_time", best["elapsed"])
+                    if on_solution is not None and on_solution(best):
+                        break
+        finally:
+            # the workers that are still running stop at their next iteration
+            with self.stopped_query.get_lock():
+                self.stopped_query.value = self.query_id
+        planning_time = time.time() - start_time
+
+        if best is None:
+            return PlanResult([], float('inf'), path_tree([]), planning_time, info)
+        info.setdefault("first_solution_time", best["elapsed"])
+        return PlanResult(best["path"], best["cost"], path_tree(best["path"]), planning_time, info)
+
+
+if __name__ == "__main__":
+    START_POINT = (int(mapping.X_MAX/2 - 50), int(mapping.Y_MAX/2))
+    GOAL_POINT = (int(mapping.X_MAX/2 + 50), int(mapping.Y_MAX/2))
+    DEADLINE = 1.0
+    # cbest 1 keeps every worker improving its path until the deadline
+
+    color_map = mapping.draw_simple_map2()
+    for workers in sorted({1, os.cpu_count()}):
+        with ParallelPlanner(color_map, workers=workers, seed=0, num_of_iterations=10 ** 9, cbest=1) as planner:
+            result = planner.plan(START_POINT, GOAL_POINT, deadline=DEADLINE)
+        print(f"{workers} workers, {DEADLINE}s: cost {result.cost:.3f}, {result.iterations} iterations")
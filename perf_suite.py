@@ -0,0 +1,356 @@
+# perf_suite.py
+"""
+Micro and macro benchmarks of the planners with recorded baselines.
+
+The micro benchmarks time the kernels the planners spend their time in, one call at a time, on
+fixed random inputs:
+    get_line_coordinates, path_is_good (cached and uncached, with both collision checkers),
+    paths_are_free (batches of 32 lines, with both collision checkers),
+    get_neighbor_nodes and find_closest_point (grid and kd-tree index), map preprocessing
+    (create_occupancy_grid, clearance and pyramid), backtrack and sampling
+The macro benchmarks time a whole query of every planner on every map of benchmark.MAPS with a
+fixed seed and a fixed number of iterations, starting from an empty edge cache.
+
+    python3 perf_suite.py --record     runs everything and writes the baseline file
+    python3 perf_suite.py              runs everything and compares it to the baseline file
+
+Every benchmark is run --repeat times and the median is kept. A benchmark that is more than
+--threshold times slower than its baseline is measured again (--retries), and if it stays that slow
+it is a regression and the suite exits with status 1, so it can gate a change. Baselines are only
+comparable on the machine they were recorded on.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import timeit
+import numpy as np
+import mapping
+import rrt
+import rrt_star
+import sampling
+import spatial_index
+from benchmark import MAPS
+from planner import Planner, ALGORITHMS
+from tree import Tree, NO_PARENT
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perf_baseline.json")
+START_POINT = (100, 150)
+GOAL_POINT = (200, 150)
+MACRO_ITERATIONS = 2000
+MACRO_MIN_TIME = .5
+SEED = 0
+
+
+"""
+returns n random pairs of free points of the map that are at most max_length apart
+"""
+def random_segments(occupancy_map, n, max_length, rng):
+    segments = []
+    while len(segments) < n:
+        x_points, y_points = occupancy_map.random_free_points(2 * n, rng)
+        points = list(zip(x_points.tolist(), y_points.tolist()))
+        for pt1, pt2 in zip(points[0::2], points[1::2]):
+            if math.dist(pt1, pt2) <= max_length and len(segments) < n:
+                segments.append((pt1, pt2))
+    return segments
+
+
+"""
+returns a tree of num_of_nodes random free points, every one attached to a random earlier node,
+and a spatial index of the given backend over it
+"""
+def random_tree(occupancy_map, num_of_nodes, backend, rng):
+    tree = Tree()
+    node_index = spatial_index.create_spatial_index(backend=backend, cell_size=25)
+    x_points, y_points = occupancy_map.random_free_points(num_of_nodes, rng)
+    for i, pt in enumerate(zip(x_points.tolist(), y_points.tolist())):
+        parent = int(rng.integers(0, i)) if i > 0 else NO_PARENT
+        c2c = 0 if i == 0 else tree.c2c[parent] + math.dist(pt, tree.coordinates(parent))
+        node_index.insert(pt, tree.add_node(pt, c2c, parent))
+    return tree, node_index
+
+
+"""
+micro benchmarks: name -> function that sets the benchmark up and returns (calls, run), where
+run() makes calls calls of the kernel
+"""
+def micro_benchmarks():
+    benchmarks = {}
+
+    def line_coordinates():
+        segments = random_segments(mapping.get_occupancy_map(MAPS["simple2"]()), 200, 300, np.random.default_rng(SEED))
+        return len(segments), lambda: [mapping.get_line_coordinates(pt1, pt2) for pt1, pt2 in segments]
+    benchmarks["get_line_coordinates"] = line_coordinates
+
+    def path_is_good(collision_checker, cached):
+        def setup():
+            grid = mapping.get_occupancy_map(MAPS["simple2"]()).grid
+            occupancy_map = mapping.OccupancyMap(grid, edge_cache_size=100000 if cached else 0,
+                                                 collision_checker=collision_checker)
+            segments = random_segments(occupancy_map, 500, 50, np.random.default_rng(SEED))
+            # builds the clearance field or the pyramid, and fills the cache
+            for pt1, pt2 in segments:
+                rrt_star.path_is_good(occupancy_map, pt1, pt2)
+            return len(segments), lambda: [rrt_star.path_is_good(occupancy_map, pt1, pt2) for pt1, pt2 in segments]
+        return setup
+    for collision_checker in ("clearance", "pyramid"):
+        benchmarks["path_is_good_" + collision_checker] = path_is_good(collision_checker, cached=False)
+    benchmarks["path_is_good_cached"] = path_is_good("clearance", cached=True)
+
+    def paths_are_free(collision_checker):
+        def setup():
+            grid = mapping.get_occupancy_map(MAPS["simple2"]()).grid
+            occupancy_map = mapping.OccupancyMap(grid, edge_cache_size=0, collision_checker=collision_checker)
+            segments = random_segments(occupancy_map, 512, 50, np.random.default_rng(SEED))
+            # neighborhoods of 32 lines from one point, timed per line like path_is_good
+            batches = [(segments[i][0], [pt2 for _, pt2 in segments[i:i + 32]]) for i in range(0, len(segments), 32)]
+            for pt, endpoints in batches:
+                occupancy_map.paths_are_free(pt, endpoints)
+            return len(segments), lambda: [occupancy_map.paths_are_free(pt, endpoints) for pt, endpoints in batches]
+        return setup
+    for collision_checker in ("clearance", "pyramid"):
+        benchmarks["paths_are_free_" + collision_checker] = paths_are_free(collision_checker)
+
+    def neighbor_nodes(backend):
+        def setup():
+            occupancy_map = mapping.get_occupancy_map(MAPS["simple2"]())
+            rng = np.random.default_rng(SEED)
+            tree, node_index = random_tree(occupancy_map, 5000, backend, rng)
+            x_points, y_points = occupancy_map.random_free_points(500, rng)
+            points = list(zip(x_points.tolist(), y_points.tolist()))
+            return len(points), lambda: [rrt_star.get_neighbor_nodes(pt, 25, node_index) for pt in points]
+        return setup
+
+    def closest_point(backend):
+        def setup():
+            occupancy_map = mapping.get_occupancy_map(MAPS["simple2"]())
+            rng = np.random.default_rng(SEED)
+            tree, node_index = random_tree(occupancy_map, 5000, backend, rng)
+            x_points, y_points = occupancy_map.random_free_points(500, rng)
+            points = list(zip(x_points.tolist(), y_points.tolist()))
+            for pt in points:
+                rrt.find_closest_point(occupancy_map, pt, node_index)
+            return len(points), lambda: [rrt.find_closest_point(occupancy_map, pt, node_index) for pt in points]
+        return setup
+    for backend in ("grid", "kdtree"):
+        benchmarks["get_neighbor_nodes_" + backend] = neighbor_nodes(backend)
+        benchmarks["find_closest_point_" + backend] = closest_point(backend)
+
+    def create_occupancy_grid():
+        color_map = MAPS["simple2"]()
+        return 1, lambda: mapping.create_occupancy_grid(color_map)
+    benchmarks["create_occupancy_grid"] = create_occupancy_grid
+
+    def clearance():
+        grid = mapping.get_occupancy_map(MAPS["simple2"]()).grid
+        return 1, lambda: mapping.OccupancyMap(grid).clearance
+    benchmarks["clearance"] = clearance
+
+    def pyramid():
+        grid = mapping.get_occupancy_map(MAPS["simple2"]()).grid
+        return 1, lambda: mapping.OccupancyMap(grid).pyramid
+    benchmarks["pyramid"] = pyramid
+
+    def backtrack():
+        occupancy_map = mapping.get_occupancy_map(MAPS["simple2"]())
+        tree, node_index = random_tree(occupancy_map, 5000, "grid", np.random.default_rng(SEED))
+        # the deepest nodes have the longest paths
+        leaves = np.argsort(tree.c2c[:len(tree)])[-100:].tolist()
+        return len(leaves), lambda: [rrt_star.backtrack(tree, leaf) for leaf in leaves]
+    benchmarks["backtrack"] = backtrack
+
+    def sample(strategy):
+        def setup():
+            occupancy_map = mapping.get_occupancy_map(MAPS["simple2"]())
+            sampler = sampling.create_sampler(occupancy_map, START_POINT, GOAL_POINT, 12, strategy=strategy,
+                                              rng=np.random.default_rng(SEED))
+            return 10000, lambda: [sampler.sample() for _ in range(10000)]
+        return setup
+    for strategy in ("uniform", "bridge"):
+        benchmarks["sample_" + strategy] = sample(strategy)
+
+    return benchmarks
+
+
+"""
+macro benchmarks: name -> function that sets the benchmark up and returns run(), which plans one
+seeded query from START_POINT to GOAL_POINT
+"""
+def macro_benchmarks():
+    benchmarks = {}
+    for algorithm in ALGORITHMS:
+        for map_name, draw_map in MAPS.items():
+            def setup(algorithm=algorithm, draw_map=draw_map):
+                occupancy_map = mapping.get_occupancy_map(draw_map())
+
+                def run():
+                    # every run starts from the same state of the cache
+                    occupancy_map.edge_cache.clear()
+                    planner = Planner(occupancy_map, algorithm, num_of_iterations=MACRO_ITERATIONS, time_limit=math.inf,
+                                      seed=SEED)
+                    planner.plan(START_POINT, GOAL_POINT)
+                return run
+            benchmarks[algorithm + "_" + map_name] = setup
+    return benchmarks
+
+
+"""
+returns the median of repeat runs of a micro benchmark, in seconds per call of the kernel
+"""
+def time_micro(setup, repeat):
+    calls, run = setup()
+    run()
+    # enough runs per measurement to take about 100ms, so the timer resolution does not matter
+    number = max(1, round(.1 / max(timeit.timeit(run, number=1), 1e-6)))
+    return statistics.median(timeit.repeat(run, number=number, repeat=repeat)) / number / calls
+
+
+"""
+returns the median run of a macro benchmark in seconds. Short queries are run until they took
+MACRO_MIN_TIME in total, so their median is taken over enough runs to be stable.
+"""
+def time_macro(setup, repeat):
+    run = setup()
+    times = []
+    while len(times) < repeat or sum(times) < MACRO_MIN_TIME:
+        start_time = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start_time)
+    return statistics.median(times)
+
+
+# level -> (function returning its benchmarks, function timing one of them)
+LEVELS = {"micro": (micro_benchmarks, time_micro),
+          "macro": (macro_benchmarks, time_macro)}
+
+
+"""
+runs the benchmarks whose name contains one of names (all of them if names is empty) and returns
+{"micro": {name: seconds}, "macro": {name: seconds}}
+"""
+def run_suite(levels=("micro", "macro"), names=(), repeat=3, verbose=True):
+    results = {}
+    for level in levels:
+        benchmarks, timer = LEVELS[level]
+        results[level] = {}
+        for name, benchmark in benchmarks().items():
+            if names and not any(part in name for part in names):
+                continue
+            results[level][name] = time_benchmark(level, benchmark, repeat)
+            if verbose:
+                print(f"{level:<6}{name:<36}{format_time(results[level][name]):>12}")
+    return results
+
+
+def time_benchmark(level, benchmark, repeat):
+    # draw_random_map and anything else that uses the random module stays the same from run to run
+    random.seed(SEED)
+    return LEVELS[level][1](benchmark, repeat)
+
+
+def format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.3f}s"
+
+
+"""
+returns (level, name) of the benchmarks of results that are more than threshold times slower than
+their baseline
+"""
+def find_regressions(results, baseline, threshold):
+    return [(level, name) for level, times in results.items() for name, seconds in times.items()
+            if name in baseline.get(level, {}) and seconds / baseline[level][name] > threshold]
+
+
+"""
+times the regressions of results again, up to retries times, and keeps the fastest time of every
+benchmark. A slow run caused by the rest of the machine is not repeated, a real regression is.
+"""
+def confirm_regressions(results, baseline, threshold, repeat, retries):
+    for _ in range(retries):
+        regressions = find_regressions(results, baseline, threshold)
+        if not regressions:
+            return
+        for level, name in regressions:
+            seconds = time_benchmark(level, LEVELS[level][0]()[name], repeat)
+            results[level][name] = min(results[level][name], seconds)
+
+
+"""
+prints results next to baseline and returns the names of the benchmarks that are more than
+threshold times slower than their baseline. Benchmarks without a baseline are reported but never fail.
+"""
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'benchmark':<42}{'time':>12}{'baseline':>12}{'ratio':>8}")
+    for level, times in results.items():
+        for name, seconds in times.items():
+            reference = baseline.get(level, {}).get(name)
+            if reference is None:
+                print(f"{level + ' ' + name:<42}{format_time(seconds):>12}{'-':>12}{'-':>8}  new")
+                continue
+            ratio = seconds / reference
+            status = ""
+            if ratio > threshold:
+                status = "  REGRESSION"
+                regressions.append(level + " " + name)
+            elif ratio < 1 / threshold:
+                status = "  faster"
+            print(f"{level + ' ' + name:<42}{format_time(seconds):>12}{format_time(reference):>12}{ratio:>8.2f}{status}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro and macro benchmarks of the planners")
+    parser.add_argument("--record", action="store_true", help="write the results to the baseline file instead of comparing")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="a benchmark this many times slower than its baseline is a regression")
+    parser.add_argument("--level", nargs="+", default=["micro", "macro"], choices=("micro", "macro"))
+    parser.add_argument("--filter", nargs="+", default=[], help="only run the benchmarks whose name contains one of these")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the median is kept")
+    parser.add_argument("--retries", type=int, default=2, help="times a regression is measured again before it fails")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_suite(args.level, args.filter, args.repeat)
+
+    if args.record:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        # recording a part of the suite keeps the baselines of the rest
+        for level, times in results.items():
+            baseline.setdefault(level, {}).update(times)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("Baseline written to", args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        raise Exception("no baseline file, record one with --record: " + args.baseline)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    confirm_regressions(results, baseline, args.threshold, args.repeat, args.retries)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}x: " + ", ".join(regressions))
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,400 @@
+# planner.py
+import math
+import queue
+import threading
+import time
+import numpy as np
+import mapping
+import spatial_index
+import rrt
+import rrt_star
+import informed_rrt_star
+import bit_star
+import prm
+import profiling
+import sampling
+from tree import Tree, solution_record, path_tree
+
+
+ALGORITHMS = ("rrt", "rrt_star", "informed_rrt_star", "bit_star", "prm")
+
+
+"""
+PlanResult
+
+path:          list of (x, y) coordinates from the start point to the goal region, empty if no
+               solution was found
+cost:          length of the path, inf if no solution was found
+tree:          Tree of the explored nodes. For PRM it only holds the path
+planning_time: seconds spent in explore (for PRM in the query, not in building the roadmap)
+info:          dictionary filled by explore with "iterations", "first_solution_time" and
+               "first_solution_iteration" (the last two only if a solution was found), and by
+               plan with "edge_cache_hits" and "edge_cache_misses" of the query
+stats:         profiling.PlanStats of the query if the planner profiles, otherwise None
+"""
+class PlanResult:
+    def __init__(self, path, cost, tree, planning_time, info):
+        self.path = path
+        self.cost = cost
+        self.tree = tree
+        self.planning_time = planning_time
+        self.info = info
+        self.iterations = info.get("iterations", 0)
+        self.first_solution_time = info.get("first_solution_time")
+        self.first_solution_iteration = info.get("first_solution_iteration")
+        self.edge_cache_hits = info.get("edge_cache_hits", 0)
+        self.edge_cache_misses = info.get("edge_cache_misses", 0)
+        self.stats = info.get("stats")
+
+    @property
+    def solution_found(self):
+        return len(self.path) > 0
+
+    @property
+    def num_of_nodes(self):
+        return len(self.tree)
+
+    def __str__(self):
+        return f"Solution found: {self.solution_found}  Cost: {self.cost}  Nodes: {self.num_of_nodes}  Time: {self.planning_time}"
+
+
+def path_length(path):
+    return sum(math.dist(pt1, pt2) for pt1, pt2 in zip(path[:-1], path[1:]))
+
+
+"""
+Planner
+
+Plans on one map with one set of parameters. The map is preprocessed when the planner is created
+(through mapping.get_occupancy_map, so planners on the same map share the preprocessing) and
+plan() can then be called for any number of start and goal points.
+
+map_:              color map (numpy_array [y, x, [color]]), mapping.OccupancyMap or path of a map file
+                   (see mapping.load_occupancy_grid)
+algorithm:         "rrt", "rrt_star", "informed_rrt_star", "bit_star" or "prm"
+num_of_iterations: maximum number of samples per query
+goal_radius:       a node closer than this to the goal point is a solution
+rewiring_radius:   neighborhood radius of RRT*, informed RRT* and BIT*, and connection radius of PRM
+cbest:             RRT*, informed RRT* and BIT* stop once cost_min / cost_max reaches cbest
+time_limit:        RRT*, informed RRT* and BIT* stop after this many seconds
+batch_size:        number of samples per batch of BIT*
+prune:             informed RRT* removes the nodes that can not improve the solution, see
+                   informed_rrt_star.prune_tree
+roadmap_nodes:     number of nodes of the PRM roadmap
+roadmap_directory: directory the PRM roadmap is saved to and memory-mapped from, see prm.get_roadmap.
+                   The roadmap is built by the first query and reused by all of the others
+index_backend:     "grid" or "kdtree", see spatial_index.create_spatial_index
+lazy:              RRT* and informed RRT* only check the edges of their solutions, see lazy.py
+bidirectional:     RRT and RRT* also grow a tree from the goal point and connect the two trees, see
+                   rrt.explore_connect and rrt_star.explore_bidirectional. Takes precedence over lazy
+sampling_strategy: one of sampling.STRATEGIES
+goal_bias:         probability of sampling the goal region with the "goal" strategies
+path_bias:         probability of sampling near the current solution with the "path" strategies
+obstacle_bias:     probability of sampling with the obstacle test of the "bridge" and "gaussian"
+                   strategies, see sampling.ObstacleSampler. PRM draws its roadmap nodes with them
+seed:              seed of the random generator, None for an unseeded one
+profile:           time the phases of every query and count its collision checks, samples and
+                   rewires, see profiling.py. The stats are in PlanResult.stats
+profile_file:      also run every query under cProfile and write its data to this file, implies profile
+shared_cost:       multiprocessing.Value of a double (or parallel.QueryCost) through which planners
+                   running in parallel on the same query exchange their best costs, see parallel.py.
+                   Every better solution lowers it to its cost up to the goal point, and informed RRT*
+                   samples inside the ellipse of it (sampling.SharedCostSampler)
+"""
+class Planner:
+    def __init__(self, map_, algorithm="informed_rrt_star", num_of_iterations=50000, goal_radius=12,
+                 rewiring_radius=25, cbest=.95, time_limit=60, index_backend="grid", lazy=False, bidirectional=False,
+                 sampling_strategy="uniform", goal_bias=.05, path_bias=.2, obstacle_bias=.5, batch_size=200, prune=True,
+                 roadmap_nodes=2000, roadmap_directory=None, seed=None, profile=False, profile_file=None, shared_cost=None):
+        if algorithm not in ALGORITHMS:
+            raise Exception("Planner was passed an unknown algorithm: " + str(algorithm))
+        if sampling_strategy not in sampling.STRATEGIES:
+            raise Exception("Planner was passed an unknown sampling strategy: " + str(sampling_strategy))
+        if bidirectional and algorithm not in ("rrt", "rrt_star"):
+            raise Exception("Planner only supports bidirectional search for rrt and rrt_star, not: " + str(algorithm))
+        if isinstance(map_, mapping.OccupancyMap):
+            self.occupancy_map = map_
+        elif isinstance(map_, str):
+            self.occupancy_map = mapping.load_occupancy_map(map_)
+        else:
+            self.occupancy_map = mapping.get_occupancy_map(map_)
+        self.algorithm = algorithm
+        self.num_of_iterations = num_of_iterations
+        self.goal_radius = goal_radius
+        self.rewiring_radius = rewiring_radius
+        self.cbest = cbest
+        self.time_limit = time_limit
+        self.index_backend = index_backend
+        self.lazy = lazy
+        self.bidirectional = bidirectional
+        self.sampling_strategy = sampling_strategy
+        self.goal_bias = goal_bias
+        self.path_bias = path_bias
+        self.obstacle_bias = obstacle_bias
+        self.batch_size = batch_size
+        self.prune = prune
+        self.roadmap_nodes = roadmap_nodes
+        self.roadmap_directory = roadmap_directory
+        self.roadmap = None
+        self.rng = np.random.default_rng(seed)
+        self.profile = profile or profile_file is not None
+        self.profile_file = profile_file
+        self.shared_cost = shared_cost
+
+    """
+    start_point: tuple - (x, y)
+    goal_point:  tuple - (x, y)
+    renderer:    visualization.TreeRenderer, only used by informed RRT* and BIT*. None runs headless
+    on_solution: function called with a tree.solution_record ("cost", "path", "iteration" and
+                 "elapsed") every time the planner finds a better solution. The planner stops and
+                 returns the best solution so far if it returns True
+    deadline:    seconds after which the planner stops, lowers time_limit for this query only.
+                 Unlike time_limit it also stops RRT, and PRM while it builds its roadmap
+    stop:        threading.Event, the planner stops and returns the best solution so far once it is set
+    """
+    def plan(self, start_point, goal_point, renderer=None, on_solution=None, deadline=None, stop=None):
+        if not self.occupancy_map.point_is_free(start_point):
+            raise Exception("invalid starting point")
+        if not self.occupancy_map.point_is_free(goal_point):
+            raise Exception("invalid goal point")
+
+        if self.algorithm == "prm":
+            return self.plan_on_roadmap(start_point, goal_point, on_solution, deadline, stop)
+
+        time_limit = self.time_limit if deadline is None else min(self.time_limit, deadline)
+
+        tree = Tree()
+        starting_node = tree.add_node(start_point, 0)
+        node_index = spatial_index.create_spatial_index(backend=self.index_backend, cell_size=self.rewiring_radius)
+        node_index.insert(start_point, starting_node)
+
+        # RRT keeps drawing its points over the whole map unless a biased strategy is selected
+        if self.algorithm == "rrt" and self.sampling_strategy == "uniform":
+            sampler = None
+        else:
+            sampler = sampling.create_sampler(self.occupancy_map, start_point, goal_point, self.goal_radius,
+                                              strategy= self.sampling_strategy, rng= self.rng,
+                                              goal_bias= self.goal_bias, path_bias= self.path_bias,
+                                              obstacle_bias= self.obstacle_bias)
+
+        if self.shared_cost is not None:
+            if self.algorithm == "informed_rrt_star":
+                sampler = sampling.SharedCostSampler(sampler, self.shared_cost)
+            on_solution = self.share_solutions(on_solution, start_point, goal_point)
+
+        info = {}
+        edge_cache = self.occupancy_map.edge_cache
+        hits, misses = edge_cache.hits, edge_cache.misses
+        start_time = time.time()
+        if self.profile:
+            profiler = profiling.Profiler(self.occupancy_map, node_index, sampler, renderer, profile_file= self.profile_file)
+            goal_node = profiler.run(self.explore, tree, node_index, start_point, goal_point, sampler, renderer,
+                                     info, on_solution, deadline, time_limit, stop)
+            # the planners count their rejected samples themselves
+            profiler.stats.counts["rejected_samples"] = info.get("rejected_samples", 0)
+            info["stats"] = profiler.stats
+        else:
+            goal_node = self.explore(tree, node_index, start_point, goal_point, sampler, renderer, info, on_solution,
+                                     deadline, time_limit, stop)
+        planning_time = time.time() - start_time
+        info["edge_cache_hits"] = edge_cache.hits - hits
+        info["edge_cache_misses"] = edge_cache.misses - misses
+
+        if goal_node is None:
+            return PlanResult([], float('inf'), tree, planning_time, info)
+        path = [tree.coordinates(i) for i in tree.path_to(goal_node)]
+        return PlanResult(path, path_length(path), tree, planning_time, info)
+
+    """
+    returns an on_solution callback that lowers shared_cost to the cost of every better solution
+    before it calls on_solution. The path of a solution ends at a node in the goal region, so like
+    informed_rrt_star.get_random_point the distance from that node to the goal point is added to
+    its cost. The cost is never below the distance from the start to the goal point, the ellipse of
+    a lower cost would have no width.
+    """
+    def share_solutions(self, on_solution, start_point, goal_point):
+        shared_cost = self.shared_cost
+        cost_min = informed_rrt_star.distance(start_point, goal_point)
+
+        def share(solution):
+            cost_max = max(solution["cost"] + informed_rrt_star.distance(goal_point, solution["path"][-1]), cost_min)
+            with shared_cost.get_lock():
+                if cost_max < shared_cost.value:
+                    shared_cost.value = cost_max
+            return on_solution(solution) if on_solution is not None else False
+        return share
+
+    """
+    runs the explore function of the algorithm on a tree holding the start point and returns the
+    id of its goal node, or None
+    """
+    def explore(self, tree, node_index, start_point, goal_point, sampler, renderer, info, on_solution, deadline, time_limit, stop=None):
+        if self.algorithm == "rrt":
+            explore = rrt.explore_connect if self.bidirectional else rrt.explore
+            solution_found = explore(occupancy_map= self.occupancy_map,
+                                     tree= tree,
+                                     node_index= node_index,
+                                     goal_point= goal_point,
+                                     goal_radius= self.goal_radius,
+                                     num_of_iterations= self.num_of_iterations,
+                                     rng= self.rng,
+                                     info= info,
+                                     sampler= sampler,
+                                     time_limit= math.inf if deadline is None else deadline,
+                                     on_solution= on_solution,
+                                     stop= stop)
+            goal_node = len(tree) - 1 if solution_found else None
+        elif self.algorithm == "rrt_star":
+            if self.bidirectional:
+                explore = rrt_star.explore_bidirectional
+            else:
+                explore = rrt_star.explore_lazy if self.lazy else rrt_star.explore
+            goal_node = explore(occupancy_map= self.occupancy_map,
+                                tree= tree,
+                                node_index= node_index,
+                                start_point= start_point,
+                                goal_point= goal_point,
+                                goal_radius= self.goal_radius,
+                                num_of_iterations= self.num_of_iterations,
+                                rewiring_radius= self.rewiring_radius,
+                                cbest= self.cbest,
+                                time_limit= time_limit,
+                                rng= self.rng,
+                                info= info,
+                                sampler= sampler,
+                                on_solution= on_solution,
+                                stop= stop)
+        elif self.algorithm == "bit_star":
+            goal_node = bit_star.explore(occupancy_map= self.occupancy_map,
+                                         tree= tree,
+                                         node_index= node_index,
+                                         start_point= start_point,
+                                         goal_point= goal_point,
+                                         goal_radius= self.goal_radius,
+                                         num_of_iterations= self.num_of_iterations,
+                                         rewiring_radius= self.rewiring_radius,
+                                         cbest= self.cbest,
+                                         time_limit= time_limit,
+                                         batch_size= self.batch_size,
+                                         renderer= renderer,
+                                         rng= self.rng,
+                                         info= info,
+                                         sampler= sampler,
+                                         on_solution= on_solution,
+                                         stop= stop)
+        elif self.lazy:
+            goal_node, ellipse = informed_rrt_star.explore_lazy(occupancy_map= self.occupancy_map,
+                                                                tree= tree,
+                                                                node_index= node_index,
+                                                                start_point= start_point,
+                                                                goal_point= goal_point,
+                                                                goal_radius= self.goal_radius,
+                                                                num_of_iterations= self.num_of_iterations,
+                                                                rewiring_radius= self.rewiring_radius,
+                                                                cbest= self.cbest,
+                                                                time_limit= time_limit,
+                                                                rng= self.rng,
+                                                                info= info,
+                                                                sampler= sampler,
+                                                                on_solution= on_solution,
+                                                                stop= stop)
+        else:
+            goal_node, ellipse = informed_rrt_star.explore(occupancy_map= self.occupancy_map,
+                                                           tree= tree,
+                                                           node_index= node_index,
+                                                           start_point= start_point,
+                                                           goal_point= goal_point,
+                                                           goal_radius= self.goal_radius,
+                                                           num_of_iterations= self.num_of_iterations,
+                                                           rewiring_radius= self.rewiring_radius,
+                                                           cbest= self.cbest,
+                                                           time_limit= time_limit,
+                                                           renderer= renderer,
+                                                           rng= self.rng,
+                                                           info= info,
+                                                           sampler= sampler,
+                                                           prune= self.prune,
+                                                           on_solution= on_solution,
+                                                           stop= stop)
+        return goal_node
+
+    """
+    answers a query with PRM. The roadmap is built by the first query, within its deadline: if it
+    is not ready by then (or stop is set) the query has no solution and the next one builds it again
+    """
+    def plan_on_roadmap(self, start_point, goal_point, on_solution=None, deadline=None, stop=None):
+        if self.roadmap is None:
+            sampler = None
+            if self.sampling_strategy in sampling.OBSTACLE_STRATEGIES:
+                sampler = sampling.create_sampler(self.occupancy_map, start_point, goal_point, self.goal_radius,
+                                                  strategy= self.sampling_strategy, rng= self.rng,
+                                                  obstacle_bias= self.obstacle_bias)
+            self.roadmap = prm.get_roadmap(self.occupancy_map, self.roadmap_directory, self.roadmap_nodes,
+                                           self.rewiring_radius, self.rng, sampler,
+                                           math.inf if deadline is None else deadline, stop)
+            if self.roadmap is None:
+                return PlanResult([], float('inf'), path_tree([]), 0.0, {"iterations": 0})
+        info = {}
+        start_time = time.time()
+        if self.profile:
+            profiler = profiling.Profiler(self.occupancy_map, profile_file= self.profile_file)
+            path, cost = profiler.run(prm.query, self.occupancy_map, self.roadmap, start_point, goal_point,
+                                      self.rewiring_radius, info, stop)
+            info["stats"] = profiler.stats
+        else:
+            path, cost = prm.query(self.occupancy_map, self.roadmap, start_point, goal_point, self.rewiring_radius, info, stop)
+        planning_time = time.time() - start_time
+        info["iterations"] = info.get("expanded_nodes", 0)
+
+        tree = path_tree(path)
+        if on_solution is not None and path:
+            on_solution(solution_record(tree, len(tree) - 1, info["iterations"], planning_time))
+        return PlanResult(path, cost, tree, planning_time, info)
+
+    """
+    Anytime interface of plan. Plans in a background thread and yields the tree.solution_record of
+    every better solution as soon as it is found, so the caller can act on the first solution while
+    the planner keeps improving it. Stops when the planner finishes or after deadline seconds,
+    whichever comes first. Closing the generator early stops the planner at its next iteration.
+
+    for solution in planner.solutions(start_point, goal_point, deadline=1.0):
+        print(solution["elapsed"], solution["cost"])
+    """
+    def solutions(self, start_point, goal_point, deadline=None):
+        if not self.occupancy_map.point_is_free(start_point):
+            raise Exception("invalid starting point")
+        if not self.occupancy_map.point_is_free(goal_point):
+            raise Exception("invalid goal point")
+        found = queue.Queue()
+        stop = threading.Event()
+
+        def on_solution(solution):
+            found.put(solution)
+            return stop.is_set()
+
+        def run():
+            try:
+                self.plan(start_point, goal_point, on_solution=on_solution, deadline=deadline, stop=stop)
+            except Exception as e:
+                found.put(e)
+            # None marks the end of the search
+            found.put(None)
+
+        start_time = time.time()
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            while True:
+                timeout = None if deadline is None else deadline - (time.time() - start_time)
+                if timeout is not None and timeout <= 0:
+                    return
+                try:
+                    solution = found.get(timeout=timeout)
+                except queue.Empty:
+                    return
+                if solution is None:
+                    return
+                if isinstance(solution, Exception):
+                    raise solution
+                yield solution
+        finally:
+            stop.set()
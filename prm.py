@@ -0,0 +1,290 @@
+"""
+code based on this paper:
+https://ieeexplore.ieee.org/document/508439
+"""
+
+# prm.py
+import hashlib
+import heapq
+import json
+import math
+import os
+import time
+import numpy as np
+import mapping
+import spatial_index
+
+
+FILES = ("x", "y", "indptr", "indices", "weights")
+
+
+def map_hash(occupancy_map):
+    return hashlib.sha1(np.packbits(occupancy_map.grid).data).hexdigest()
+
+
+"""
+Roadmap
+
+Undirected graph of collision free edges between free points of a map, stored in compressed
+sparse row (CSR) form:
+    x, y    - coordinates of the nodes
+    indptr  - the neighbors of node i are indices[indptr[i]:indptr[i + 1]]
+    indices - ids of the neighbors
+    weights - length of the edge to each neighbor
+save() writes every array to its own .npy file, so load() can memory-map them instead of reading
+them into memory.
+
+info: dictionary with the shape and hash of the map and the parameters the roadmap was built with
+"""
+class Roadmap:
+    def __init__(self, x, y, indptr, indices, weights, info):
+        self.x = x
+        self.y = y
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.info = info
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def num_of_edges(self):
+        return len(self.indices) // 2
+
+    def coordinates(self, node):
+        return (int(self.x[node]), int(self.y[node]))
+
+    def neighbors(self, node):
+        start, end = self.indptr[node], self.indptr[node + 1]
+        return zip(self.indices[start:end].tolist(), self.weights[start:end].tolist())
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in FILES:
+            np.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+        with open(os.path.join(directory, "info.json"), "w") as f:
+            json.dump(self.info, f, indent=2)
+
+    """
+    mmap: memory-map the arrays read only instead of reading them into memory
+    """
+    @staticmethod
+    def load(directory, mmap=True):
+        arrays = [np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if mmap else None) for name in FILES]
+        # plain array views of the mapped files, slicing a numpy.memmap is several times slower
+        arrays = [np.asarray(array) for array in arrays]
+        with open(os.path.join(directory, "info.json")) as f:
+            info = json.load(f)
+        return Roadmap(*arrays, info)
+
+    """
+    ids of the nodes within radius of pt, closest first
+    """
+    def nodes_near(self, pt, radius):
+        # the coordinates are unsigned, the differences to pt can be negative
+        dist = np.hypot(self.x.astype(np.float64) - pt[0], self.y.astype(np.float64) - pt[1])
+        near = np.flatnonzero(dist <= radius)
+        return near[np.argsort(dist[near], kind="stable")].tolist()
+
+
+"""
+build_roadmap
+
+Samples num_of_nodes distinct free cells of the map and connects every pair closer than
+connection_radius with a collision free straight line.
+
+sampler: sampling.ObstacleSampler that draws the nodes, so more of them end up in the narrow
+         passages of the map. The nodes are uniform over the free cells if None
+time_limit: seconds after which building is given up
+stop:    threading.Event, building is given up once it is set
+returns the Roadmap, or None if building was given up
+"""
+def build_roadmap(occupancy_map, num_of_nodes=2000, connection_radius=30, rng=None, sampler=None,
+                  time_limit=float('inf'), stop=None):
+    start_time = time.time()
+
+    def given_up():
+        return time.time() - start_time >= time_limit or (stop is not None and stop.is_set())
+
+    if rng is None:
+        rng = np.random.default_rng()
+    if sampler is not None:
+        cells = {}
+        # the attempts are limited in case the map has fewer free cells than num_of_nodes
+        for _ in range(20 * num_of_nodes):
+            if len(cells) == num_of_nodes:
+                break
+            if len(cells) % 256 == 0 and given_up():
+                return None
+            x, y = sampler.sample()
+            cells[y * occupancy_map.x_dim_len + x] = None
+        cells = np.fromiter(cells, np.int64, len(cells))
+    elif occupancy_map.grid.size <= occupancy_map.FREE_CELLS_LIMIT:
+        free_cells = occupancy_map.free_cells
+        cells = rng.choice(free_cells, size=min(num_of_nodes, len(free_cells)), replace=False)
+    else:
+        cells = np.zeros(0, np.int64)
+        while len(cells) < num_of_nodes:
+            x_points, y_points = occupancy_map.random_free_points(2 * num_of_nodes, rng)
+            cells = np.unique(np.concatenate((cells, y_points * occupancy_map.x_dim_len + x_points)))
+        cells = rng.permutation(cells)[:num_of_nodes]
+    y_points, x_points = np.divmod(cells, occupancy_map.x_dim_len)
+    coord_dtype = np.uint16 if max(occupancy_map.x_dim_len, occupancy_map.y_dim_len) <= np.iinfo(np.uint16).max else np.int32
+    x_points = x_points.astype(coord_dtype)
+    y_points = y_points.astype(coord_dtype)
+
+    node_index = spatial_index.GridIndex(cell_size=connection_radius)
+    points = list(zip(x_points.tolist(), y_points.tolist()))
+    for node, pt in enumerate(points):
+        node_index.insert(pt, node)
+
+    adjacency = [[] for _ in points]
+    for node, pt in enumerate(points):
+        if given_up():
+            return None
+        neighbors = [neighbor for neighbor in node_index.radius(pt, connection_radius) if neighbor > node]
+        # every edge is checked, so the edges of the nodes with many neighbors are checked at once
+        if len(neighbors) >= occupancy_map.batch_min_lines:
+            free = occupancy_map.paths_are_free(pt, [points[neighbor] for neighbor in neighbors]).tolist()
+        else:
+            free = [occupancy_map.path_is_free(pt, points[neighbor]) for neighbor in neighbors]
+        for neighbor, is_free in zip(neighbors, free):
+            if is_free:
+                adjacency[node].append(neighbor)
+                adjacency[neighbor].append(node)
+
+    indptr = np.zeros(len(points) + 1, np.int64)
+    indptr[1:] = np.cumsum([len(neighbors) for neighbors in adjacency])
+    indices = np.fromiter((n for neighbors in adjacency for n in neighbors), np.int32, int(indptr[-1]))
+    sources = np.repeat(np.arange(len(points)), np.diff(indptr))
+    weights = np.hypot(x_points[indices].astype(np.float32) - x_points[sources],
+                       y_points[indices].astype(np.float32) - y_points[sources]).astype(np.float32)
+    info = {"shape": list(occupancy_map.grid.shape),
+            "map_hash": map_hash(occupancy_map),
+            "num_of_nodes": num_of_nodes,
+            "connection_radius": connection_radius,
+            "sampling": "uniform" if sampler is None else sampler.strategy}
+    return Roadmap(x_points, y_points, indptr, indices, weights, info)
+
+
+"""
+get_roadmap
+
+Returns the roadmap of a map. If directory holds a roadmap built on the same map with the same
+parameters it is memory-mapped from there, otherwise a new one is built and saved to directory.
+directory None only builds the roadmap. Returns None if building was given up (see build_roadmap),
+nothing is saved then.
+"""
+def get_roadmap(occupancy_map, directory=None, num_of_nodes=2000, connection_radius=30, rng=None, sampler=None,
+                time_limit=float('inf'), stop=None):
+    if directory is not None and os.path.exists(os.path.join(directory, "info.json")):
+        roadmap = Roadmap.load(directory)
+        info = roadmap.info
+        # roadmaps saved before the sampling was recorded were all uniform
+        if info["map_hash"] == map_hash(occupancy_map) and info["num_of_nodes"] == num_of_nodes \
+                and info["connection_radius"] == connection_radius \
+                and info.get("sampling", "uniform") == ("uniform" if sampler is None else sampler.strategy):
+            return roadmap
+    roadmap = build_roadmap(occupancy_map, num_of_nodes, connection_radius, rng, sampler, time_limit, stop)
+    if roadmap is not None and directory is not None:
+        roadmap.save(directory)
+    return roadmap
+
+
+"""
+query
+
+Connects start_point and goal_point to the roadmap nodes within connection_radius that they can
+reach with a collision free line, and searches the roadmap with A*.
+
+info - dictionary - if given, it is filled with "expanded_nodes"
+stop - threading.Event, the search gives up once it is set
+returns the path as a list of (x, y) coordinates from start_point to goal_point and its cost,
+or ([], inf) if the points can not be connected or the search was given up
+"""
+def query(occupancy_map, roadmap:Roadmap, start_point, goal_point, connection_radius=30, info:dict=None, stop=None):
+    if occupancy_map.path_is_free(start_point, goal_point):
+        return [start_point, goal_point], math.dist(start_point, goal_point)
+
+    # the goal point is node -1 of the search, its edges are kept apart from the roadmap
+    goal_edges = {}
+    for node in roadmap.nodes_near(goal_point, connection_radius):
+        pt = roadmap.coordinates(node)
+        if occupancy_map.path_is_free(pt, goal_point):
+            goal_edges[node] = math.dist(pt, goal_point)
+    if not goal_edges:
+        return [], float('inf')
+
+    queue = []
+    c2c = {}
+    parent = {}
+    for node in roadmap.nodes_near(start_point, connection_radius):
+        pt = roadmap.coordinates(node)
+        if occupancy_map.path_is_free(start_point, pt):
+            c2c[node] = math.dist(start_point, pt)
+            parent[node] = None
+            heapq.heappush(queue, (c2c[node] + math.dist(pt, goal_point), c2c[node], node))
+
+    closed = set()
+    best_cost = float('inf')
+    best_node = None
+    while queue:
+        if stop is not None and stop.is_set():
+            best_node = None
+            break
+        estimate, cost, node = heapq.heappop(queue)
+        if estimate >= best_cost:
+            break
+        if node in closed:
+            continue
+        closed.add(node)
+        if node in goal_edges and cost + goal_edges[node] < best_cost:
+            best_cost = cost + goal_edges[node]
+            best_node = node
+        # the costs and estimates of all of the neighbors are computed at once
+        start, end = roadmap.indptr[node], roadmap.indptr[node + 1]
+        neighbors = roadmap.indices[start:end]
+        new_costs = cost + roadmap.weights[start:end].astype(np.float64)
+        estimates = new_costs + np.hypot(roadmap.x[neighbors].astype(np.float64) - goal_point[0],
+                                         roadmap.y[neighbors].astype(np.float64) - goal_point[1])
+        for neighbor, new_cost, estimate in zip(neighbors.tolist(), new_costs.tolist(), estimates.tolist()):
+            if neighbor not in closed and new_cost < c2c.get(neighbor, float('inf')):
+                c2c[neighbor] = new_cost
+                parent[neighbor] = node
+                heapq.heappush(queue, (estimate, new_cost, neighbor))
+    if info is not None:
+        info["expanded_nodes"] = len(closed)
+    if best_node is None:
+        return [], float('inf')
+
+    path = [goal_point]
+    node = best_node
+    while node is not None:
+        path.append(roadmap.coordinates(node))
+        node = parent[node]
+    path.append(start_point)
+    path.reverse()
+    return path, best_cost
+
+
+if __name__ == "__main__":
+    X_MAX = mapping.X_MAX
+    Y_MAX = mapping.Y_MAX
+    START_POINT = (int(X_MAX/2 - 50), int(Y_MAX/2))
+    GOAL_POINT = (int(X_MAX/2 + 50),int (Y_MAX/2))
+    NUM_OF_NODES = 2000
+    CONNECTION_RADIUS = 30
+    ROADMAP_DIRECTORY = "roadmaps/simple_map2"
+
+    occupancy_map = mapping.get_occupancy_map(mapping.draw_simple_map2())
+
+    start_time = time.time()
+    roadmap = get_roadmap(occupancy_map, ROADMAP_DIRECTORY, NUM_OF_NODES, CONNECTION_RADIUS)
+    print("Roadmap with", len(roadmap), "nodes and", roadmap.num_of_edges, "edges ready after (seconds):", time.time() - start_time)
+
+    start_time = time.time()
+    path, cost = query(occupancy_map, roadmap, START_POINT, GOAL_POINT, CONNECTION_RADIUS)
+    print("Query answered after (seconds):", time.time() - start_time)
+    print("cost:", cost)
+    print("path:", path)
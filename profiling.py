@@ -0,0 +1,263 @@
+# profiling.py
+"""
+Per-phase timers and counters of a planning query.
+
+A Profiler wraps the methods that the planners call on the objects of a query (the occupancy map,
+the tree, the spatial index, the sampler and the renderer) with functions that time them and count
+the calls, runs explore, and puts the original methods back. The planners themselves are not
+changed, so a query that is not profiled runs exactly the same code and pays nothing for it. Only
+the rejected samples are counted by the planners themselves, in the info of the query.
+
+The time of every phase is exclusive: the collision checks made inside a nearest neighbor query
+(rrt.find_closest_point) count as collision checking, not as neighbor search. The time spent
+outside of all of the phases (the loops of the planners and their bookkeeping) is PlanStats.other_time.
+
+Tree and the spatial index classes are wrapped on the class, so the trees and indexes that explore
+creates itself (the goal tree of the bidirectional planners) are profiled too. While a query is
+profiled, queries running in other threads of the same process are counted with it. Queries can be
+profiled at the same time: every profiler adds its own wrapper to a method that is replaced once
+(see add_wrap), and the last one to finish puts the method back.
+"""
+import cProfile
+import pstats
+import threading
+import time
+import rrt
+from tree import Tree
+
+
+"""
+phases the time of a query is split into:
+    sampling           - drawing samples from the sampler
+    neighbor_search    - radius and nearest neighbor queries of the spatial index
+    collision_checking - point and line checks against the map
+    tree_update        - adding, rewiring, detaching and removing nodes
+    drawing            - calls to the TreeRenderer
+"""
+PHASES = ("sampling", "neighbor_search", "collision_checking", "tree_update", "drawing")
+
+"""
+counters of a query:
+    samples                   - samples drawn from the sampler, or by rrt.get_random_point
+    rejected_samples          - samples that did not add a node to a tree, counted by the planner
+                                in its info and copied by planner.Planner.plan
+    neighbor_queries          - radius and nearest neighbor queries
+    point_checks              - calls to OccupancyMap.point_is_free
+    collision_checks          - calls to OccupancyMap.path_is_free
+    batched_lines             - lines checked by OccupancyMap.paths_are_free
+    uncached_collision_checks - collision checks that missed the edge cache
+    pixels_rasterized         - cells of the lines that were checked one by one
+    nodes_added               - nodes added to the trees
+    rewires                   - nodes given a new parent
+"""
+COUNTERS = ("samples", "rejected_samples", "neighbor_queries", "point_checks", "collision_checks",
+            "batched_lines", "uncached_collision_checks", "pixels_rasterized", "nodes_added", "rewires")
+
+
+"""
+PlanStats
+
+phase_times:  dictionary - seconds spent in every phase of PHASES
+counts:       dictionary - value of every counter of COUNTERS
+total_time:   seconds spent in the profiled query
+profile:      pstats.Stats of the query if it was run with cProfile, otherwise None
+profile_file: file the cProfile data was written to, or None
+"""
+class PlanStats:
+    def __init__(self):
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.total_time = 0.0
+        self.profile = None
+        self.profile_file = None
+
+    @property
+    def other_time(self):
+        return max(self.total_time - sum(self.phase_times.values()), 0.0)
+
+    def as_dict(self):
+        return {"total_time": self.total_time,
+                "other_time": self.other_time,
+                "phase_times": dict(self.phase_times),
+                "counts": dict(self.counts),
+                "profile_file": self.profile_file}
+
+    def __str__(self):
+        lines = [f"total time: {self.total_time:.4f}s"]
+        for phase, seconds in list(self.phase_times.items()) + [("other", self.other_time)]:
+            share = 100 * seconds / self.total_time if self.total_time > 0 else 0
+            lines.append(f"  {phase:<20}{seconds:10.4f}s {share:6.1f}%")
+        for name, count in self.counts.items():
+            lines.append(f"  {name:<26}{count:>12}")
+        return "\n".join(lines)
+
+
+"""
+Profiler
+
+occupancy_map: mapping.OccupancyMap of the query
+node_index:    spatial index of the tree, its class is profiled. None if the query has none (PRM)
+sampler:       sampler of the query, or None
+renderer:      visualization.TreeRenderer of the query, or None
+cprofile:      also run the query under cProfile, the pstats.Stats are put in PlanStats.profile
+profile_file:  file the cProfile data is written to (see pstats), implies cprofile
+"""
+class Profiler:
+    def __init__(self, occupancy_map, node_index=None, sampler=None, renderer=None, cprofile=False, profile_file=None):
+        self.occupancy_map = occupancy_map
+        self.node_index = node_index
+        self.sampler = sampler
+        self.renderer = renderer
+        self.cprofile = cprofile or profile_file is not None
+        self.profile_file = profile_file
+        self.stats = PlanStats()
+        # time spent in the phases called by the phase that is running, one entry per running phase
+        self.nested_time = []
+        self.patches = []
+
+    """
+    calls function(*args, **kwargs) with the profiling wrappers in place and returns its result.
+    The stats are in self.stats afterwards.
+    """
+    def run(self, function, *args, **kwargs):
+        self._patch_all()
+        profile = cProfile.Profile() if self.cprofile else None
+        start_time = time.perf_counter()
+        try:
+            if profile is not None:
+                profile.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.disable()
+        finally:
+            self.stats.total_time = time.perf_counter() - start_time
+            self._unpatch_all()
+            if profile is not None:
+                self.stats.profile = pstats.Stats(profile)
+                if self.profile_file is not None:
+                    profile.dump_stats(self.profile_file)
+                    self.stats.profile_file = self.profile_file
+
+    def _patch_all(self):
+        occupancy_map = self.occupancy_map
+        self._patch(occupancy_map, "point_is_free", "collision_checking", "point_checks")
+        self._patch(occupancy_map, "path_is_free", "collision_checking", "collision_checks")
+        self._patch(occupancy_map, "paths_are_free", "collision_checking", "batched_lines",
+                    lambda pt, endpoints: len(endpoints))
+        self._patch(occupancy_map, "path_is_free_uncached", "collision_checking", "uncached_collision_checks")
+        self._patch(occupancy_map, "path_is_free_exact", "collision_checking", "pixels_rasterized",
+                    lambda pt1, pt2: max(abs(pt2[0] - pt1[0]), abs(pt2[1] - pt1[1])) + 1)
+        self._patch(Tree, "add_node", "tree_update", "nodes_added")
+        self._patch(Tree, "rewire", "tree_update", "rewires")
+        self._patch(Tree, "detach", "tree_update")
+        self._patch(Tree, "compact", "tree_update")
+        self._patch(Tree, "graft", "tree_update")
+        if self.node_index is not None:
+            index_class = type(self.node_index)
+            self._patch(index_class, "radius", "neighbor_search", "neighbor_queries")
+            self._patch(index_class, "nearest_iter", "neighbor_search", "neighbor_queries", generator=True)
+        if self.sampler is not None:
+            self._patch(self.sampler, "sample", "sampling", "samples")
+        # RRT draws its points with rrt.get_random_point when it has no sampler
+        self._patch(rrt, "get_random_point", "sampling", "samples")
+        if self.renderer is not None:
+            for name in ("add_edge", "rewire_edge", "redraw", "set_solution", "draw_frame", "show"):
+                self._patch(self.renderer, name, "drawing")
+
+    def _unpatch_all(self):
+        for owner, name, wrap in reversed(self.patches):
+            remove_wrap(owner, name, wrap)
+        self.patches = []
+
+    """
+    wraps owner.name with a wrapper that adds its exclusive time to phase and counts the calls
+    in counter. amount(*args) is added to the counter instead of 1 if given. Methods of classes
+    (Tree, the spatial index) are wrapped on the class, the others on the instance.
+    """
+    def _patch(self, owner, name, phase, counter=None, amount=None, generator=False):
+        stats = self.stats
+        nested_time = self.nested_time
+        is_class = isinstance(owner, type)
+
+        def timed(call):
+            start = time.perf_counter()
+            nested_time.append(0.0)
+            try:
+                return call()
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.phase_times[phase] += elapsed - nested_time.pop()
+                if nested_time:
+                    nested_time[-1] += elapsed
+
+        def count(args, kwargs):
+            if counter is not None:
+                arguments = args[1:] if is_class else args
+                stats.counts[counter] += 1 if amount is None else amount(*arguments, **kwargs)
+
+        def wrap(function):
+            if generator:
+                # the work of a generator is done by next(), so every step is timed
+                def wrapper(*args, **kwargs):
+                    count(args, kwargs)
+                    iterator = timed(lambda: function(*args, **kwargs))
+                    while True:
+                        try:
+                            item = timed(lambda: next(iterator))
+                        except StopIteration:
+                            return
+                        yield item
+            else:
+                def wrapper(*args, **kwargs):
+                    count(args, kwargs)
+                    return timed(lambda: function(*args, **kwargs))
+            return wrapper
+
+        add_wrap(owner, name, wrap)
+        self.patches.append((owner, name, wrap))
+
+
+# the methods replaced by a dispatcher, by (id of the owner, name), and the lock of its changes
+patches = {}
+patches_lock = threading.Lock()
+
+
+"""
+adds wrap to the wraps of owner.name. The first one replaces owner.name with a dispatcher that
+calls the original method through wrap(method) of every profiler that is running, so the
+profilers of overlapping queries (other threads, the same class or map) each count the calls
+once, and stop counting as soon as they remove their wrap. The last one to be removed puts the
+original method back.
+"""
+def add_wrap(owner, name, wrap):
+    with patches_lock:
+        patch = patches.get((id(owner), name))
+        if patch is None:
+            function = getattr(owner, name)
+            # only attributes set on the owner itself are put back, the others are deleted again
+            patch = {"owner": owner, "original": owner.__dict__.get(name), "wraps": ()}
+
+            def dispatcher(*args, **kwargs):
+                call = function
+                for wrap_call in patch["wraps"]:
+                    call = wrap_call(call)
+                return call(*args, **kwargs)
+
+            patches[(id(owner), name)] = patch
+            # on a class the dispatcher replaces the plain function, so it gets self as its first argument
+            setattr(owner, name, dispatcher)
+        patch["wraps"] = patch["wraps"] + (wrap,)
+
+
+def remove_wrap(owner, name, wrap):
+    with patches_lock:
+        patch = patches[(id(owner), name)]
+        patch["wraps"] = tuple(other for other in patch["wraps"] if other is not wrap)
+        if not patch["wraps"]:
+            del patches[(id(owner), name)]
+            if patch["original"] is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, patch["original"])
@@ -0,0 +1,102 @@
+# rewiring.py
+"""
+Building blocks of RRT* and informed RRT* (explore in rrt_star.py and informed_rrt_star.py) that
+check their edges against the map: choosing the parent of a new node and the neighbors it rewires.
+Large neighborhoods are checked in one call of OccupancyMap.paths_are_free, see
+OccupancyMap.batch_min_lines.
+"""
+import heapq
+import math
+import numpy as np
+from tree import Tree
+
+
+# edges that create_new_node checks one at a time before it checks the rest of a large neighborhood at once
+SINGLE_PARENT_CHECKS = 4
+
+
+def distance (pt1, pt2): 
+        distance = math.sqrt(pow(pt2[0] - pt1[0], 2) + pow(pt2[1] - pt1[1], 2))
+        return distance
+
+
+def path_is_good(occupancy_map, pt1, pt2):
+    return occupancy_map.path_is_free(pt1, pt2)
+
+
+"""
+Given a new point, and a list of old points, determine lowest cost to come to the new point from the old points.
+The cheapest parent is usually free, so the edges are checked one at a time, cheapest first. When
+the first SINGLE_PARENT_CHECKS are blocked and OccupancyMap.batch_min_lines old points or more are
+left, the rest are checked in one call of OccupancyMap.paths_are_free by create_new_node_batch.
+"""
+def create_new_node(occupancy_map, tree:Tree, pt, nodes_in_neightborhood):
+    temp_queue = []
+    for parent_node in nodes_in_neightborhood:
+        dist = distance(pt, tree.coordinates(parent_node))
+        c2c = dist + float(tree.c2c[parent_node])
+        heapq.heappush(temp_queue, (c2c, parent_node))
+    checked = 0
+    while temp_queue:
+        if checked == SINGLE_PARENT_CHECKS and len(temp_queue) >= occupancy_map.batch_min_lines:
+            return create_new_node_batch(occupancy_map, tree, pt, [node for _, node in temp_queue])
+        c2c, best_neighbor = heapq.heappop(temp_queue)
+        if path_is_good(occupancy_map, pt1= pt, pt2= tree.coordinates(best_neighbor)):
+            return tree.add_node(pt, c2c, best_neighbor)
+        checked += 1
+    return None
+
+
+"""
+create_new_node with the edges to all of the old points checked at once. The cheapest free one is
+used, the one with the lowest id on a tie like the heap of create_new_node.
+"""
+def create_new_node_batch(occupancy_map, tree:Tree, pt, nodes_in_neightborhood):
+    nodes = np.asarray(nodes_in_neightborhood, np.int64)
+    c2c = neighbor_distances(tree, pt, nodes) + tree.c2c[nodes]
+    free = occupancy_map.paths_are_free(pt, np.stack((tree.x[nodes], tree.y[nodes]), axis=1))
+    candidates = np.lexsort((nodes, c2c))
+    candidates = candidates[free[candidates]]
+    if len(candidates) == 0:
+        return None
+    best = candidates[0]
+    return tree.add_node(pt, float(c2c[best]), int(nodes[best]))
+
+
+"""
+distances from pt to the nodes, computed like distance() so the costs are the same to the last bit
+"""
+def neighbor_distances(tree:Tree, pt, nodes):
+    dx = tree.x[nodes].astype(np.float64) - pt[0]
+    dy = tree.y[nodes].astype(np.float64) - pt[1]
+    return np.sqrt(dx * dx + dy * dy)
+
+
+"""
+yields (node, c2c) for every neighbor that new_node gives a lower c2c over a free edge. The c2c
+is compared when the neighbor is reached, so the rewires of the earlier neighbors are accounted
+for. When OccupancyMap.batch_min_lines neighbors or more would get cheaper, their edges are
+checked in one call of OccupancyMap.paths_are_free.
+"""
+def rewire_candidates(occupancy_map, tree:Tree, new_node, nodes_in_neightborhood):
+    new_coordinates = tree.coordinates(new_node)
+    if len(nodes_in_neightborhood) < occupancy_map.batch_min_lines:
+        for node in nodes_in_neightborhood:
+            node_coordinates = tree.coordinates(node)
+            dist = distance(pt1= new_coordinates, pt2= node_coordinates)
+            tempC2C = dist + tree.c2c[new_node]
+            if tempC2C < tree.c2c[node]:
+                if path_is_good(occupancy_map, pt1= new_coordinates, pt2= node_coordinates):
+                    yield node, tempC2C
+        return
+    nodes = np.asarray(nodes_in_neightborhood, np.int64)
+    new_c2c = neighbor_distances(tree, new_coordinates, nodes) + tree.c2c[new_node]
+    improved = new_c2c < tree.c2c[nodes]
+    nodes, new_c2c = nodes[improved], new_c2c[improved]
+    if len(nodes) < occupancy_map.batch_min_lines:
+        free = [path_is_good(occupancy_map, new_coordinates, tree.coordinates(node)) for node in nodes.tolist()]
+    else:
+        free = occupancy_map.paths_are_free(new_coordinates, np.stack((tree.x[nodes], tree.y[nodes]), axis=1))
+    for node, tempC2C, is_free in zip(nodes.tolist(), new_c2c.tolist(), free):
+        if is_free and tempC2C < tree.c2c[node]:
+            yield node, tempC2C
@@ -1,44 +1,28 @@
 # rrt_star.py
 import mapping
 import math
-import random
 import numpy as np
 import cv2 as cv
 from mapping import SCALE_FACTOR
-import heapq
+import time
+import spatial_index
+from tree import Tree, solution_record
 
 
+# number of nodes of the other tree that explore_connect tries to connect a new node to
+CONNECT_CANDIDATES = 10
 
-class Node:
-    def __init__(self):
-        self.costToCome = float('inf')
-        self.parentCoordinates = []
 
-    def __str__(self):
-        return f"Cost To Come: {self.costToCome}  Parent Coordinates: {self.parentCoordinates}"
-
-
-def create_pixel_info_map(color_map):
-    pixel_info_map = np.ndarray.tolist(color_map)
-
-    y_dim_len = color_map.shape[0]
-    x_dim_len = color_map.shape[1]
-
-    for x in range(0, x_dim_len):
-        for y in range(0, y_dim_len):
-            if mapping.point_is_valid(color_map=color_map, coordinates=(x, y)):
-                obs = False
-            else:
-                obs = True
-            pixel_info_map[y][x] = {"c2c": float('inf'), "parentCoor": None, "selfCoordinates":(x, y),"obstacle":obs}
-    return pixel_info_map
-
-
-def get_random_point ():
+"""
+gets a random point in the bounds of the map
+occupancy_map - mapping.OccupancyMap - the map being explored
+rng - numpy random Generator
+"""
+def get_random_point (occupancy_map, rng):
     # generate a random x coordinate within the limit
-    x_coord = random.randint(0, mapping.X_MAX_SCALED-1)
+    x_coord = int(rng.integers(0, occupancy_map.x_dim_len))
     # generate a random y coordinate within the limit
-    y_coord = random.randint(0, mapping.Y_MAX_SCALED-1)
+    y_coord = int(rng.integers(0, occupancy_map.y_dim_len))
     rand_pt = (x_coord, y_coord)
     return rand_pt
     
@@ -48,133 +32,197 @@ def distance (pt1, pt2):
     return distance
 
 
-def path_is_good(pt1, pt2):
-    line = get_line_coordinates(pt1, pt2)
-    for point in line:
-        point_int = tuple(map(int, point))
-        if not mapping.point_is_valid(color_map=color_map, coordinates=point_int):
-            return False
-    return True
+def path_is_good(occupancy_map, pt1, pt2):
+    return occupancy_map.path_is_free(pt1, pt2)
 
 
 """
-    Returns a list of coordinates between two points (x1, y1) and (x2, y2) using Bresenham's line algorithm.
+find_closest_point
+
+Returns the id of the explored node closest to pt that can be reached from pt
+with a collision free line, or None if there is no such node.
+
+occupancy_map: mapping.OccupancyMap of the map
+node_index: spatial index of the explored nodes
 """
-def get_line_coordinates(p1, p2):
-    
-    x1, y1, x2, y2 = p1[0], p1[1], p2[0], p2[1]
-
-    coordinates = []
-    dx = abs(x2 - x1)
-    dy = abs(y2 - y1)
-    sx = -1 if x1 > x2 else 1
-    sy = -1 if y1 > y2 else 1
-    err = dx - dy
-
-    while x1 != x2 or y1 != y2:
-        coordinates.append((x1, y1))
-        e2 = 2 * err
-        if e2 > -dy:
-            err -= dy
-            x1 += sx
-        if e2 < dx:
-            err += dx
-            y1 += sy
-
-    coordinates.append((x2, y2))
-
-    return coordinates
-
-
-def find_closest_point(pt, explored_nodes):
-    p_queue = []
-    for node in explored_nodes:
-        dist = distance(pt, node["selfCoordinates"])
-        heapq.heappush(p_queue, (dist, node["selfCoordinates"]))
-
-    try:
-        while(True):
-            weight, closest_neighbor = heapq.heappop(p_queue)
-            if path_is_good(pt1= pt, pt2= closest_neighbor):
-                return closest_neighbor
-    except IndexError:
-        return(None)
-    
+def find_closest_point(occupancy_map, pt, node_index):
+    return node_index.nearest_valid(pt, lambda coordinates: path_is_good(occupancy_map, pt1= pt, pt2= coordinates))
 
 
-def explore(pixel_map:list, explored_nodes:list, goal_point:tuple, goal_radius, num_of_iterations:int):
+
+"""
+rng - numpy random Generator, a new unseeded one is used if None
+sampler - sampler of the sampling strategy, see sampling.create_sampler. If None the points are
+          drawn uniformly over the whole map with get_random_point
+info - dictionary - if given, it is filled with "iterations", "rejected_samples" (samples that did
+                    not add a node), and with "first_solution_time" and "first_solution_iteration"
+                    once a solution is found
+time_limit - seconds after which the search gives up
+on_solution - function called with tree.solution_record of the solution when one is found
+stop - threading.Event, the search stops once it is set (see planner.Planner.solutions)
+"""
+def explore(occupancy_map, tree:Tree, node_index, goal_point:tuple, goal_radius, num_of_iterations:int, rng=None, info:dict=None, sampler=None, \
+            time_limit=float('inf'), on_solution=None, stop=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    start_time = time.time()
+    rejected_samples = 0
     for i in range(0, num_of_iterations):
-        new_pt = get_random_point()
-        x, y = new_pt 
-        if pixel_map[y][x]["obstacle"] == False:
+        if time.time() - start_time >= time_limit or (stop is not None and stop.is_set()):
+            num_of_iterations = i
+            break
+        if sampler is None:
+            new_pt = get_random_point(occupancy_map, rng)
+        else:
+            new_pt = sampler.sample()
+        new_node = None
+        if occupancy_map.point_is_free(new_pt):
             # Find the explored point that is closest to the new point
-            closest_point = find_closest_point(new_pt, explored_nodes)
-            if closest_point is not None:
-                new_node = {"c2c": 0, "parentCoordinates": closest_point, "selfCoordinates": new_pt, "obstacle": False}
-                explored_nodes.append(new_node)
-                pixel_map[y][x] = new_node
+            closest_node = find_closest_point(occupancy_map, new_pt, node_index)
+            if closest_node is not None:
+                c2c = tree.c2c[closest_node] + distance(pt1= new_pt, pt2= tree.coordinates(closest_node))
+                new_node = tree.add_node(new_pt, c2c, closest_node)
+                node_index.insert(new_pt, new_node)
                 
                 if distance(pt1= new_pt , pt2= goal_point) < goal_radius:
+                    if info is not None:
+                        info["iterations"] = i + 1
+                        info["rejected_samples"] = rejected_samples
+                        info["first_solution_time"] = time.time() - start_time
+                        info["first_solution_iteration"] = i + 1
+                    if on_solution is not None:
+                        on_solution(solution_record(tree, new_node, i + 1, time.time() - start_time))
                     return True  # return 0 if a solution is found
+        if new_node is None:
+            rejected_samples += 1
 
     # return 1 if no solution is found
+    if info is not None:
+        info["iterations"] = num_of_iterations
+        info["rejected_samples"] = rejected_samples
     return False
 
 
 
-def backtrack (explored_nodes:list, map_:list):
-    print("Backtracking...")
-    solution_path = []
-    current_node = explored_nodes[-1]
-    solution_path.append(current_node)
-    
-    # (C2G, C2C, TC, point_index, (x,y,theta)parent_coordinates, (x,y,theta)coordinates)
-    while current_node["parentCoordinates"] is not None:
-        x, y = current_node["parentCoordinates"]
-        parent_node = map_[y][x]
-        current_node = parent_node
-        solution_path.append(parent_node)
+"""
+returns the id of the node of the other tree closest to pt that can be reached from pt with a
+collision free line. Only the CONNECT_CANDIDATES closest nodes are tried, so a failed connection
+does not check a line to every node of a tree that is on the other side of an obstacle.
+"""
+def find_connection(occupancy_map, pt, node_index):
+    for count, (dist, coordinates, item) in enumerate(node_index.nearest_iter(pt)):
+        if count == CONNECT_CANDIDATES:
+            break
+        if path_is_good(occupancy_map, pt1= pt, pt2= coordinates):
+            return item
+    return None
 
-    solution_path.reverse()
-    return solution_path 
+
+"""
+bidirectional variant of explore (RRT-Connect). A second tree is grown from the goal point and the
+two trees take turns: every iteration one of them grows towards a new sample, and the new node
+tries to connect to the closest nodes of the other tree. Through a narrow passage both trees only
+have to reach the passage from their own side, instead of one tree having to find its way through
+and on to the goal region.
+Once the trees are connected, the path from the connection to the goal point is copied into tree
+with Tree.graft, so the goal point is the last node of tree, as with explore.
+Takes the same arguments as explore.
+"""
+def explore_connect(occupancy_map, tree:Tree, node_index, goal_point:tuple, goal_radius, num_of_iterations:int, rng=None, info:dict=None, sampler=None, \
+                    time_limit=float('inf'), on_solution=None, stop=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    goal_tree = Tree()
+    goal_index = spatial_index.create_empty_like(node_index)
+    goal_index.insert(goal_point, goal_tree.add_node(goal_point, 0))
+    trees = ((tree, node_index), (goal_tree, goal_index))
+    start_time = time.time()
+    rejected_samples = 0
+    for i in range(0, num_of_iterations):
+        if time.time() - start_time >= time_limit or (stop is not None and stop.is_set()):
+            num_of_iterations = i
+            break
+        if sampler is None:
+            new_pt = get_random_point(occupancy_map, rng)
+        else:
+            new_pt = sampler.sample()
+        new_node = None
+        if occupancy_map.point_is_free(new_pt):
+            growing_tree, growing_index = trees[i % 2]
+            other_tree, other_index = trees[1 - i % 2]
+            closest_node = find_closest_point(occupancy_map, new_pt, growing_index)
+            if closest_node is not None:
+                c2c = growing_tree.c2c[closest_node] + distance(pt1= new_pt, pt2= growing_tree.coordinates(closest_node))
+                new_node = growing_tree.add_node(new_pt, c2c, closest_node)
+                growing_index.insert(new_pt, new_node)
+
+                other_node = find_connection(occupancy_map, new_pt, other_index)
+                if other_node is not None:
+                    start_node, goal_node = (new_node, other_node) if growing_tree is tree else (other_node, new_node)
+                    for node in tree.graft(goal_tree, goal_node, start_node):
+                        node_index.insert(tree.coordinates(node), node)
+                    if info is not None:
+                        info["iterations"] = i + 1
+                        info["rejected_samples"] = rejected_samples
+                        info["first_solution_time"] = time.time() - start_time
+                        info["first_solution_iteration"] = i + 1
+                    if on_solution is not None:
+                        on_solution(solution_record(tree, len(tree) - 1, i + 1, time.time() - start_time))
+                    return True
+        if new_node is None:
+            rejected_samples += 1
+
+    if info is not None:
+        info["iterations"] = num_of_iterations
+        info["rejected_samples"] = rejected_samples
+    return False
+
+
+"""
+returns the ids of the nodes from the start to the last node added to the tree
+"""
+def backtrack (tree:Tree):
+    return tree.path_to(len(tree) - 1)
 
 
 
 if __name__ == "__main__":
 
     # --- Simulation Setup -----------------------
-    explored_nodes_list = []
     NUM_OF_ITERATIONS = 5000
     START_POINT = (150, 120)
     GOAL_POINT = (290, 290)
     GOAL_RADIUS = 5
+    HEADLESS = False
 
     color_map = mapping.draw_simple_map()
-    pixel_info_map = create_pixel_info_map(color_map)
+    occupancy_map = mapping.get_occupancy_map(color_map)
     
-    if( not mapping.point_is_valid(color_map=color_map, coordinates=START_POINT)):
+    if( not occupancy_map.point_is_free(START_POINT)):
         print("invalid starting point")
         exit()
 
-    if( not mapping.point_is_valid(color_map=color_map, coordinates=GOAL_POINT)):
+    if( not occupancy_map.point_is_free(GOAL_POINT)):
         print("invalid goal point")
         exit()
     
-    starting_node = {"c2c": 0, "parentCoordinates": None, "selfCoordinates": START_POINT, "obstacle": False}
-    explored_nodes_list.append(starting_node)
-    
-    pixel_info_map[starting_node["selfCoordinates"][1]] [starting_node["selfCoordinates"][0]] = starting_node
+    explored_nodes_tree = Tree()
+    starting_node = explored_nodes_tree.add_node(START_POINT, 0)
+    node_index = spatial_index.create_spatial_index(backend="grid", cell_size=25)
+    node_index.insert(START_POINT, starting_node)
 
 
     # --- Run the algorithm ---------------------------
-    solution_found = explore(pixel_map= pixel_info_map, \
-                             explored_nodes= explored_nodes_list, \
+    solution_found = explore(occupancy_map= occupancy_map, \
+                             tree= explored_nodes_tree, \
+                             node_index= node_index, \
                              goal_point=GOAL_POINT,\
                              goal_radius=GOAL_RADIUS, \
                              num_of_iterations= NUM_OF_ITERATIONS)
     if solution_found == True:
-        print("Number of iterations needed to find solution: " + str(len(explored_nodes_list)))
-        solution = backtrack(explored_nodes= explored_nodes_list, map_= pixel_info_map)
+        print("Number of iterations needed to find solution: " + str(len(explored_nodes_tree)))
+        print("Backtracking...")
+        solution = backtrack(tree= explored_nodes_tree)
     else: 
         print("Solution not found after " + str(NUM_OF_ITERATIONS) + " points checked!")
         exit()
@@ -182,28 +230,29 @@ if __name__ == "__main__":
 
     #--- Display results ----------------------------
 
-    cv.circle(color_map, GOAL_POINT, radius=GOAL_RADIUS, color=mapping.GRAY, thickness=-1)
+    if not HEADLESS:
+        cv.circle(color_map, GOAL_POINT, radius=GOAL_RADIUS, color=mapping.GRAY, thickness=-1)
 
-    for i in explored_nodes_list:
-        mapping.draw_node(child_coordinates=i["selfCoordinates"], \
-                          parent_coordinates=i["parentCoordinates"], \
-                          map= color_map, color= mapping.BLUE)
-    cv.imshow('RRT Algorithm', color_map)
-    cv.waitKey(0)
+        for i in range(0, len(explored_nodes_tree)):
+            mapping.draw_node(child_coordinates=explored_nodes_tree.coordinates(i), \
+                              parent_coordinates=explored_nodes_tree.parent_coordinates(i), \
+                              map= color_map, color= mapping.BLUE)
+        cv.imshow('RRT Algorithm', color_map)
+        cv.waitKey(0)
 
-    for i in solution:
-        mapping.draw_node(child_coordinates=i["selfCoordinates"], \
-                          parent_coordinates=i["parentCoordinates"], \
-                          map= color_map, color= mapping.RED)
+        for i in solution:
+            mapping.draw_node(child_coordinates=explored_nodes_tree.coordinates(i), \
+                              parent_coordinates=explored_nodes_tree.parent_coordinates(i), \
+                              map= color_map, color= mapping.RED)
+            cv.imshow('RRT Algorithm', color_map)
+            cv.waitKey(0)
+
+        end_point = solution[-1]
+        mapping.draw_node(child_coordinates=explored_nodes_tree.coordinates(end_point), \
+                          parent_coordinates= None, \
+                          map= color_map, color= mapping.GREEN)
         cv.imshow('RRT Algorithm', color_map)
         cv.waitKey(0)
-                        
-    end_point = solution[-1]
-    mapping.draw_node(child_coordinates=i["selfCoordinates"], \
-                      parent_coordinates= None, \
-                      map= color_map, color= mapping.GREEN)
-    cv.imshow('RRT Algorithm', color_map)
-    cv.waitKey(0)
-
-    print("Explored_nodes_matrix:", len(explored_nodes_list))
+
+    print("Explored_nodes_matrix:", len(explored_nodes_tree))
     
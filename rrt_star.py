@@ -5,259 +5,241 @@ https://arxiv.org/pdf/1404.2334.pdf
 
 # rrt_star.py
 import mapping
-import math
-import random
-import numpy as np
 import cv2 as cv
-from mapping import SCALE_FACTOR
 import heapq
-from heapq import heapify
 import time
-
-
-
-class Node:
-    def __init__(self):
-        self.costToCome = float('inf')
-        self.parentCoordinates = []
-
-    def __str__(self):
-        return f"Cost To Come: {self.costToCome}  Parent Coordinates: {self.parentCoordinates}"
-
-
-def create_pixel_info_map(color_map):
-    pixel_info_map = np.ndarray.tolist(color_map)
-
-    y_dim_len = color_map.shape[0]
-    x_dim_len = color_map.shape[1]
-
-    for x in range(0, x_dim_len):
-        for y in range(0, y_dim_len):
-            if mapping.point_is_valid(color_map=color_map, coordinates=(x, y)):
-                obs = False
-            else:
-                obs = True
-            pixel_info_map[y][x] = {"c2c": float('inf'), "parentCoor": None, "selfCoordinates":(x, y),"obstacle":obs}
-    return pixel_info_map
+import spatial_index
+import lazy
+from tree import Tree, SolutionHeap, ConnectionHeap, solution_record, path_record
+from sampling import InformedSampler
+from rewiring import distance, path_is_good, create_new_node, rewire_candidates
 
 
 """
-gets a random point in the elipse from start point to end point
-start_point - tuple - (x, y)
+gets a random point in the bounds of the map
+sampler - InformedSampler - batched sampler for this start and goal point. RRT* never sets a best
+                            cost on it, so the points are uniform over the free space of the map
 goal_point - tuple - (x, y)
-best_solution - dictionary - Represents a node. {"c2c", "parentCoordinates", "selfCoordinates", "obstacle"}
-                             Will be 'None' if no solution has been found yet
+best_solution - int - id of the best goal node in the tree
+                      Will be 'None' if no solution has been found yet
+tree - Tree - the explored nodes
+cbest - float - the search stops once cost_min / cost_max of the best solution reaches cbest
+returns None once the best solution is within cbest
 """
-def get_random_point (start_point:tuple, goal_point:tuple, best_solution:dict):
+def get_random_point (sampler:InformedSampler, goal_point:tuple, best_solution, tree:Tree, cbest):
     if best_solution is not None:
-        x_point, y_point = -1, -1
-        best_solution_coordinates = (best_solution["selfCoordinates"][0], best_solution["selfCoordinates"][1])
-        # this makes sure the new point is in the bounds of the map
-        cost_min = distance(start_point, goal_point)
-        # print("cost min=", cost_min)
-        cost_max = best_solution["c2c"] + distance(goal_point, best_solution_coordinates)
-        # print("cost_max=", cost_max)
-        # print("cbest=", cost_min/cost_max)
-        while (cost_min/cost_max < cbest) :
-            while(x_point < 0 or x_point > mapping.X_MAX_SCALED-1 or y_point < 0 or y_point > mapping.X_MAX_SCALED-1):
-                x_point = np.random.randint(0, mapping.X_MAX_SCALED)
-                y_point = np.random.randint(0, mapping.Y_MAX_SCALED)
-            return (x_point, y_point)
-        with open('output.txt', 'w') as f:
-            print("cost min:", cost_min)
-            print("cost_max:", cost_max)
-            print("cbest:", cost_min/cost_max)
-            # write_data_to_file("cost min:" + str(cost_min))
-            # write_data_to_file("cost_max:" + str(cost_max))
-            # write_data_to_file("cbest:" + str(cost_min/cost_max))
-        return(None)
-
-    else:
-        # generate a random point in the bounds of the map
-        x_coord = random.randint(0, mapping.X_MAX_SCALED-1)
-        y_coord = random.randint(0, mapping.Y_MAX_SCALED-1)
-        rand_pt = (x_coord, y_coord)
-        return rand_pt
-
-
-def distance (pt1, pt2): 
-        distance = math.sqrt(pow(pt2[0] - pt1[0], 2) + pow(pt2[1] - pt1[1], 2))
-        return distance
-
-
-def path_is_good(pt1, pt2):
-    line = get_line_coordinates(pt1, pt2)
-    for point in line:
-        point_int = tuple(map(int, point))
-        if not mapping.point_is_valid(color_map=color_map, coordinates=point_int):
-            return False
-    return True
+        best_solution_coordinates = tree.coordinates(best_solution)
+        cost_min = sampler.cost_min
+        cost_max = tree.c2c[best_solution] + distance(goal_point, best_solution_coordinates)
+        if cost_min/cost_max >= cbest:
+            return(None)
+    return sampler.sample()
 
 
 """
-    Returns a list of coordinates between two points (x1, y1) and (x2, y2) using Bresenham's line algorithm.
+gets all of the previously explored nodes within a given radius of a given point
+node_index - spatial index of the explored nodes
 """
-def get_line_coordinates(p1, p2):
-    
-    x1, y1, x2, y2 = p1[0], p1[1], p2[0], p2[1]
-    coordinates = []
-    dx = abs(x2 - x1)
-    dy = abs(y2 - y1)
-    sx = -1 if x1 > x2 else 1
-    sy = -1 if y1 > y2 else 1
-    err = dx - dy
-    while x1 != x2 or y1 != y2:
-        coordinates.append((x1, y1))
-        e2 = 2 * err
-        if e2 > -dy:
-            err -= dy
-            x1 += sx
-        if e2 < dx:
-            err += dx
-            y1 += sy
-    coordinates.append((x2, y2))
-    return coordinates
+def get_neighbor_nodes(pt, radius, node_index): 
+    return node_index.radius(pt, radius)
 
 
-"""
-gets all of the points (explored or not) in a given radius around a given point
-"""
-def get_points_in_neighborhood(pt, radius):
-    points = set()
-    x, y = pt[0], pt[1]  # access the x and y coordinates separately
-    for i in range(x - radius, x + radius + 1):
-        for j in range(y - radius, y + radius + 1):
-            if math.sqrt((i - x) ** 2 + (j - y) ** 2) <= radius:
-                points.add((i, j))
-    points.remove((x,y))
-    return points
-
-"""
-gets all of the points in a given radius that have been previously explored
-"""
-def get_neighbor_nodes(pt, radius, explored_nodes): 
-    neighborhood = get_points_in_neighborhood(pt,radius)
-    nodes_in_neighborhood = []
-    for node in explored_nodes: 
-        if node["selfCoordinates"] in neighborhood:
-            nodes_in_neighborhood.append(node)
-    return nodes_in_neighborhood
+def update_neighborhood(occupancy_map, tree:Tree, new_node, nodes_in_neightborhood, solutions:SolutionHeap): 
+    for node, tempC2C in rewire_candidates(occupancy_map, tree, new_node, nodes_in_neightborhood):
+        updated_nodes = tree.rewire(node, new_node, tempC2C)
+        solutions.update(updated_nodes)
 
 
 """
-Given a new point, and a list of old points, determine lowest cost to come to the new point from the old points
+returns the goal node with the lowest c2c, read from the top of the solutions heap
 """
-def create_new_node(pt, nodes_in_neightborhood):
-    temp_queue = []
-    for parent_node in nodes_in_neightborhood:
-        dist = distance(pt, parent_node["selfCoordinates"])
-        c2c = dist + parent_node["c2c"]
-        heapq.heappush(temp_queue, (c2c, parent_node["selfCoordinates"]))
-    try:
-        while(True):
-            heapify(temp_queue)
-            c2c, best_neighbor = heapq.heappop(temp_queue)
-            if path_is_good(pt1= pt, pt2= best_neighbor):
-                new_node = {"c2c": c2c, 
-                            "parentCoordinates": best_neighbor, 
-                            "selfCoordinates": pt, 
-                            "obstacle": False}
-                
-                path = backtrack(new_node, pixel_info_map)
-                debug_count = 0
-                for node in path:
-                    if node["parentCoordinates"] is not None:
-                        debug_count += distance(pt1= node["parentCoordinates"], pt2= node["selfCoordinates"])
-                # if debug_count != new_node["c2c"]:
-                #     # print("gotcha")
-                return new_node
-    except IndexError:
-        return None
-
-
-def update_neighborhood(new_node, nodes_in_neightborhood, explored_nodes, pixel_map): 
-    for node in nodes_in_neightborhood:
-        dist = distance(pt1= new_node["selfCoordinates"], pt2=node ["selfCoordinates"])
-        tempC2C = dist + new_node["c2c"]
-        if tempC2C < node["c2c"]: 
-            if path_is_good(pt1=new_node["selfCoordinates"], pt2=node["selfCoordinates"]):
-                updated_neighbor = {"c2c": tempC2C, 
-                                    "parentCoordinates": new_node["selfCoordinates"], 
-                                    "selfCoordinates": node["selfCoordinates"], 
-                                    "obstacle": False}
-                for explored_node in explored_nodes:
-                    if updated_neighbor["selfCoordinates"] == explored_node["selfCoordinates"]:
-                        explored_node["c2c"] = updated_neighbor["c2c"]
-                        explored_node["parentCoordinates"] = updated_neighbor["parentCoordinates"]
-                        x, y = explored_node["selfCoordinates"]
-                        pixel_map[y][x] = explored_node
+def get_current_best_solution(solutions:SolutionHeap):
+    return solutions.best()
 
 
 """
-checks the list of solutions and determines which one has the lowest c2c
+occupancy_map - mapping.OccupancyMap - the map being explored
+tree - Tree - the explored nodes, holding only the start point when the search starts
+node_index - spatial index of the explored nodes
+rewiring_radius - radius of the neighborhood that is searched for parents and rewired
+cbest - the search stops once cost_min / cost_max of the best solution reaches cbest
+time_limit - the search stops after this many seconds
+rng - numpy random Generator used by the sampler, a new unseeded one is used if None
+sampler - sampler of the sampling strategy, see sampling.create_sampler. A uniform InformedSampler
+          is used if None
+info - dictionary - if given, it is filled with "iterations", "rejected_samples" (samples that did
+                    not add a node), and with "first_solution_time" and "first_solution_iteration"
+                    once a solution is found
+on_solution - function called with tree.solution_record of the best solution every time it
+              improves. The search stops if it returns True
+stop - threading.Event, the search stops once it is set (see planner.Planner.solutions)
 """
-def get_current_best_solution(solutions, pixel_map):
-    min_cost = float('inf')
-    best_node = None
-    for point in solutions:
-        x, y = point
-        node = pixel_map[y][x]
-        if node["c2c"] < min_cost:
-            best_node = node
-    return best_node
-
-
-import time
-
-def explore(pixel_map:list, explored_nodes:list, start_point:tuple, goal_point:tuple, goal_radius, num_of_iterations:int):
-    gen_pts_set = set()
-    solutions_set = set()
-    gen_pts_set.add(start_point)
+def explore(occupancy_map, tree:Tree, node_index, start_point:tuple, goal_point:tuple, goal_radius, num_of_iterations:int, \
+            rewiring_radius, cbest, time_limit, rng=None, info:dict=None, sampler=None, on_solution=None, stop=None):
+    solutions = SolutionHeap(tree)
     solution_path_list = []
+    if sampler is None:
+        sampler = InformedSampler(occupancy_map, start_point, goal_point, rng=rng)
     start_time = time.time()
+    iterations = 0
+    rejected_samples = 0
+    lowest_cost = float('inf')
 
     for i in range(0, num_of_iterations):
-        if time.time() - start_time >= time_limit:
+        if time.time() - start_time >= time_limit or (stop is not None and stop.is_set()):
             break  # time limit reached, break out of the loop
-        best_solution = get_current_best_solution(solutions_set, pixel_map)
-        new_pt = get_random_point(start_point, goal_point, best_solution)
+        iterations = i + 1
+        best_solution = get_current_best_solution(solutions)
+        new_pt = get_random_point(sampler, goal_point, best_solution, tree, cbest)
         if new_pt is None:
             break
-        x, y = new_pt
-        if new_pt not in gen_pts_set:
-            if pixel_map[y][x]["obstacle"] == False:
+        new_node = None
+        if tree.find(new_pt) is None:
+            if occupancy_map.point_is_free(new_pt):
                 # Find the explored point that is closest to the new point
-                nodes_in_neighborhood = get_neighbor_nodes(new_pt, rewiring_radius, explored_nodes=explored_nodes_list)
-                new_node = create_new_node(new_pt, nodes_in_neighborhood)
+                nodes_in_neighborhood = get_neighbor_nodes(new_pt, rewiring_radius, node_index)
+                new_node = create_new_node(occupancy_map, tree, new_pt, nodes_in_neighborhood)
                 if new_node is not None:
-                    explored_nodes.append(new_node)
-                    gen_pts_set.add((x, y))  
-                    pixel_map[y][x] = new_node
-                    update_neighborhood(new_node, nodes_in_neighborhood, explored_nodes, pixel_map)
+                    node_index.insert(new_pt, new_node)
+                    update_neighborhood(occupancy_map, tree, new_node, nodes_in_neighborhood, solutions)
                     
                     if distance(pt1= new_pt , pt2= goal_point) < goal_radius:
                         # print("solution found...")
-                        solutions_set.add(new_pt)
-                        solution_path_list.append(backtrack(new_node, pixel_map))
-    best_solution = get_current_best_solution(solutions_set, pixel_map)
+                        if info is not None and len(solutions) == 0:
+                            info["first_solution_time"] = time.time() - start_time
+                            info["first_solution_iteration"] = iterations
+                        solutions.add(new_node)
+                        solution_path_list.append(backtrack(tree, new_node))
+
+                    # reported in the iteration that improved it, the search can end before the next one
+                    best_solution = get_current_best_solution(solutions)
+                    if (best_solution is not None) and (tree.c2c[best_solution] < lowest_cost):
+                        lowest_cost = tree.c2c[best_solution]
+                        sampler.set_path([tree.coordinates(node) for node in backtrack(tree, best_solution)])
+                        if on_solution is not None and on_solution(solution_record(tree, best_solution, iterations, time.time() - start_time)):
+                            break
+        if new_node is None:
+            rejected_samples += 1
+    best_solution = get_current_best_solution(solutions)
+    if info is not None:
+        info["iterations"] = iterations
+        info["rejected_samples"] = rejected_samples
     return best_solution
 
                     
 
-def backtrack (last_node:dict, map_:list):
-    solution_path = []
-    current_node = last_node
-    solution_path.append(current_node)
-    
-    # (C2G, C2C, TC, point_index, (x,y,theta)parent_coordinates, (x,y,theta)coordinates)
-    while current_node["parentCoordinates"] is not None:
-        x, y = current_node["parentCoordinates"]
-        parent_node = map_[y][x]
-        current_node = parent_node
-        solution_path.append(parent_node)
+"""
+lazy variant of explore. New nodes and rewired edges are added without checking them against the
+map, and only the edges on the best solution are checked, every time the best solution improves
+and before it is returned. The search loop is lazy.explore, blocked edges are repaired with
+lazy.validate_solution.
+Takes the same arguments as explore, and also fills info with "repairs" and "detached".
+"""
+def explore_lazy(occupancy_map, tree:Tree, node_index, start_point:tuple, goal_point:tuple, goal_radius, num_of_iterations:int, \
+                 rewiring_radius, cbest, time_limit, rng=None, info:dict=None, sampler=None, on_solution=None, stop=None):
+    if sampler is None:
+        sampler = InformedSampler(occupancy_map, start_point, goal_point, rng=rng)
+
+    def sample(best_solution):
+        return get_random_point(sampler, goal_point, best_solution, tree, cbest)
 
-    solution_path.reverse()
-    return solution_path 
+    return lazy.explore(occupancy_map, tree, node_index, goal_point, goal_radius, num_of_iterations, rewiring_radius,
+                        time_limit, sample, sampler, info, on_solution, stop)
+
+
+"""
+bidirectional variant of explore. A second tree is grown from the goal point and the two trees take
+turns: every iteration one of them adds a new node and rewires its neighborhood as in explore, and
+the new node is connected to the neighbor in the other tree that gives the cheapest path through
+it. The trees keep growing and rewiring after the first connection, so the connections keep getting
+cheaper, and the cheapest one is the solution.
+Once the search stops, the path from the best connection to the goal point is copied into tree with
+Tree.graft and the id of its goal point node is returned.
+Takes the same arguments as explore.
+"""
+def explore_bidirectional(occupancy_map, tree:Tree, node_index, start_point:tuple, goal_point:tuple, goal_radius, num_of_iterations:int, \
+                          rewiring_radius, cbest, time_limit, rng=None, info:dict=None, sampler=None, on_solution=None, stop=None):
+    if sampler is None:
+        sampler = InformedSampler(occupancy_map, start_point, goal_point, rng=rng)
+    goal_tree = Tree()
+    goal_index = spatial_index.create_empty_like(node_index)
+    goal_index.insert(goal_point, goal_tree.add_node(goal_point, 0))
+    # neither tree has goal nodes, the connections are the solutions. Rewiring either tree updates
+    # the costs of the connections of the rewired nodes
+    connections = ConnectionHeap(tree, goal_tree)
+    trees = ((tree, node_index, connections.sides[0]), (goal_tree, goal_index, connections.sides[1]))
+    lowest_cost = float('inf')
+    start_time = time.time()
+    iterations = 0
+    rejected_samples = 0
+
+    for i in range(0, num_of_iterations):
+        if time.time() - start_time >= time_limit or (stop is not None and stop.is_set()):
+            break  # time limit reached, break out of the loop
+        iterations = i + 1
+        if lowest_cost < float('inf') and sampler.cost_min / lowest_cost >= cbest:
+            break
+        new_pt = sampler.sample()
+        if new_pt is None:
+            break
+        new_node = None
+        growing_tree, growing_index, growing_connections = trees[i % 2]
+        other_tree, other_index, _ = trees[1 - i % 2]
+        if growing_tree.find(new_pt) is None:
+            if occupancy_map.point_is_free(new_pt):
+                nodes_in_neighborhood = get_neighbor_nodes(new_pt, rewiring_radius, growing_index)
+                new_node = create_new_node(occupancy_map, growing_tree, new_pt, nodes_in_neighborhood)
+                if new_node is not None:
+                    growing_index.insert(new_pt, new_node)
+                    update_neighborhood(occupancy_map, growing_tree, new_node, nodes_in_neighborhood, growing_connections)
+
+                    # cheapest free edge from the new node to the other tree
+                    candidates = []
+                    for node in get_neighbor_nodes(new_pt, rewiring_radius, other_index):
+                        length = distance(new_pt, other_tree.coordinates(node))
+                        heapq.heappush(candidates, (length + other_tree.c2c[node], length, node))
+                    while candidates:
+                        cost, length, other_node = heapq.heappop(candidates)
+                        if path_is_good(occupancy_map, pt1= new_pt, pt2= other_tree.coordinates(other_node)):
+                            if growing_tree is tree:
+                                connections.add(new_node, other_node, length)
+                            else:
+                                connections.add(other_node, new_node, length)
+                            break
+
+                    # reported in the iteration that improved it, the search can end before the next one
+                    best_connection = connections.best()
+                    if best_connection is not None and connections.cost(best_connection) < lowest_cost:
+                        lowest_cost = connections.cost(best_connection)
+                        solution = [tree.coordinates(node) for node in backtrack(tree, connections.start_nodes[best_connection])] + \
+                                   [goal_tree.coordinates(node) for node in reversed(backtrack(goal_tree, connections.goal_nodes[best_connection]))]
+                        sampler.set_path(solution)
+                        if info is not None and "first_solution_time" not in info:
+                            info["first_solution_time"] = time.time() - start_time
+                            info["first_solution_iteration"] = iterations
+                        if on_solution is not None and on_solution(path_record(solution, iterations, time.time() - start_time)):
+                            break
+        if new_node is None:
+            rejected_samples += 1
+
+    goal_node = None
+    best_connection = connections.best()
+    if best_connection is not None:
+        new_nodes = tree.graft(goal_tree, connections.goal_nodes[best_connection], connections.start_nodes[best_connection])
+        for node in new_nodes:
+            node_index.insert(tree.coordinates(node), node)
+        goal_node = new_nodes[-1]
+    if info is not None:
+        info["iterations"] = iterations
+        info["rejected_samples"] = rejected_samples
+    return goal_node
+
+
+"""
+returns the ids of the nodes from the start to last_node
+"""
+def backtrack (tree:Tree, last_node):
+    return tree.path_to(last_node)
 
 def write_data_to_file(data):
     with open('output.txt', 'a') as f:
@@ -270,7 +252,6 @@ if __name__ == "__main__":
     X_MAX = mapping.X_MAX
     Y_MAX = mapping.Y_MAX
     start_time = time.time()
-    explored_nodes_list = []
     NUM_OF_ITERATIONS = 50000
     START_POINT = (int(X_MAX/2 - 50), int(Y_MAX/2))
     GOAL_POINT = (int(X_MAX/2 + 50),int (Y_MAX/2))
@@ -278,38 +259,48 @@ if __name__ == "__main__":
     rewiring_radius = 40
     cbest = .97
     time_limit = 60
+    HEADLESS = False
 
     color_map = mapping.draw_simple_map2()
-    pixel_info_map = create_pixel_info_map(color_map)
+    occupancy_map = mapping.get_occupancy_map(color_map)
     
-    if( not mapping.point_is_valid(color_map=color_map, coordinates=START_POINT)):
+    if( not occupancy_map.point_is_free(START_POINT)):
         print("invalid starting point")
         exit()
 
-    if( not mapping.point_is_valid(color_map=color_map, coordinates=GOAL_POINT)):
+    if( not occupancy_map.point_is_free(GOAL_POINT)):
         print("invalid goal point")
         exit()
     
-    starting_node = {"c2c": 0, "parentCoordinates": None, "selfCoordinates": START_POINT, "obstacle": False}
-    explored_nodes_list.append(starting_node)
-    
-    pixel_info_map[starting_node["selfCoordinates"][1]] [starting_node["selfCoordinates"][0]] = starting_node
+    explored_nodes_tree = Tree()
+    starting_node = explored_nodes_tree.add_node(START_POINT, 0)
+    node_index = spatial_index.create_spatial_index(backend="grid", cell_size=rewiring_radius)
+    node_index.insert(START_POINT, starting_node)
 
     
     # --- Run the algorithm without a time limit ---------------------------
-    solution = explore(pixel_map= pixel_info_map, \
-                             explored_nodes= explored_nodes_list, \
+    solution = explore(occupancy_map= occupancy_map, \
+                             tree= explored_nodes_tree, \
+                             node_index= node_index, \
                              start_point=START_POINT,\
                              goal_point=GOAL_POINT,\
                              goal_radius=GOAL_RADIUS, \
-                             num_of_iterations= NUM_OF_ITERATIONS)
+                             num_of_iterations= NUM_OF_ITERATIONS, \
+                             rewiring_radius= rewiring_radius, \
+                             cbest= cbest, \
+                             time_limit= time_limit)
     if solution is not None:
-        print("Number of iterations needed to find solution: " + str(len(explored_nodes_list)))
-        solution = backtrack(last_node= solution, map_= pixel_info_map)
+        print("Number of iterations needed to find solution: " + str(len(explored_nodes_tree)))
+        solution = backtrack(tree= explored_nodes_tree, last_node= solution)
     else: 
         print("Solution not found after " + str(NUM_OF_ITERATIONS) + " points checked!")
         exit()
     end_time = time.time()
+    cost_min = distance(START_POINT, GOAL_POINT)
+    cost_max = explored_nodes_tree.c2c[solution[-1]] + distance(GOAL_POINT, explored_nodes_tree.coordinates(solution[-1]))
+    print("cost min:", cost_min)
+    print("cost_max:", cost_max)
+    print("cbest:", cost_min/cost_max)
     with open('output.txt', 'a') as f:
         print("Solution found after (seconds):", (end_time - start_time))
         write_data_to_file("Solution found after(seconds):" + str(end_time - start_time))
@@ -317,29 +308,30 @@ if __name__ == "__main__":
 
     #--- Display results ----------------------------
 
-    for i in explored_nodes_list:
-        mapping.draw_node(child_coordinates=i["selfCoordinates"], \
-                          parent_coordinates=i["parentCoordinates"], \
-                          map= color_map, color= mapping.BLUE)
-    cv.imshow('RRT* Algorithm', color_map)
-    cv.waitKey(0)
+    if not HEADLESS:
+        for i in range(0, len(explored_nodes_tree)):
+            mapping.draw_node(child_coordinates=explored_nodes_tree.coordinates(i), \
+                              parent_coordinates=explored_nodes_tree.parent_coordinates(i), \
+                              map= color_map, color= mapping.BLUE)
+        cv.imshow('RRT* Algorithm', color_map)
+        cv.waitKey(0)
 
-    cv.circle(color_map, GOAL_POINT, radius=GOAL_RADIUS, color=mapping.GRAY, thickness=-1)
+        cv.circle(color_map, GOAL_POINT, radius=GOAL_RADIUS, color=mapping.GRAY, thickness=-1)
 
-    for i in solution:
-        mapping.draw_node(child_coordinates=i["selfCoordinates"], \
-                          parent_coordinates=i["parentCoordinates"], \
-                          map= color_map, color= mapping.RED)
+        for i in solution:
+            mapping.draw_node(child_coordinates=explored_nodes_tree.coordinates(i), \
+                              parent_coordinates=explored_nodes_tree.parent_coordinates(i), \
+                              map= color_map, color= mapping.RED)
+            cv.imshow('RRT* Algorithm', color_map)
+            cv.waitKey(0)
+
+        end_point = solution[-1]
+        mapping.draw_node(child_coordinates=explored_nodes_tree.coordinates(end_point), \
+                          parent_coordinates= None, \
+                          map= color_map, color= mapping.GREEN)
         cv.imshow('RRT* Algorithm', color_map)
         cv.waitKey(0)
-                        
-    end_point = solution[-1]
-    mapping.draw_node(child_coordinates=i["selfCoordinates"], \
-                      parent_coordinates= None, \
-                      map= color_map, color= mapping.GREEN)
-    cv.imshow('RRT* Algorithm', color_map)
-    cv.waitKey(0)
-
-    print("Explored_nodes_matrix:", len(explored_nodes_list))
+
+    print("Explored_nodes_matrix:", len(explored_nodes_tree))
     print()
     
@@ -0,0 +1,365 @@
+# sampling.py
+import math
+import numpy as np
+
+
+STRATEGIES = ("uniform", "goal", "path", "goal_path", "bridge", "gaussian")
+
+# strategies of ObstacleSampler, they only depend on the map so PRM can build its roadmap with them
+OBSTACLE_STRATEGIES = ("bridge", "gaussian")
+
+
+"""
+InformedSampler
+
+Generates random free points for the planners in vectorized batches.
+Until a best cost is set the points are drawn uniformly from the free cells of the map. After
+set_best_cost the points are uniform inside the informed ellipse with the start and goal points as foci, as described in
+https://arxiv.org/pdf/1404.2334.pdf
+
+The rotation of the ellipse only depends on the start and goal points and is computed once. The
+axes are only recomputed when the best cost improves, and every batch is filtered against the
+map bounds and the obstacles before it is buffered, so sample() is just a list pop.
+
+occupancy_map:  mapping.OccupancyMap of the map
+start_point:    tuple - (x, y)
+goal_point:     tuple - (x, y)
+batch_size:     number of candidate points generated at a time
+rng:            numpy random Generator, a new unseeded one is used if None
+"""
+class InformedSampler:
+    def __init__(self, occupancy_map, start_point, goal_point, batch_size=4096, rng=None):
+        self.occupancy_map = occupancy_map
+        self.y_dim_len = occupancy_map.y_dim_len
+        self.x_dim_len = occupancy_map.x_dim_len
+        self.batch_size = batch_size
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.cost_min = math.dist(start_point, goal_point)
+        self.center = np.array([(start_point[0] + goal_point[0]) / 2, (start_point[1] + goal_point[1]) / 2])
+        self.angle = math.atan2(goal_point[1] - start_point[1], goal_point[0] - start_point[0])
+        cos_angle = math.cos(self.angle)
+        sin_angle = math.sin(self.angle)
+        self.rotation = np.array([[cos_angle, -sin_angle], [sin_angle, cos_angle]])
+
+        self.cost_max = float('inf')
+        self.axes = None
+        self.buffer = []
+
+    """
+    shrinks the sampling ellipse to the given solution cost. Costs that do not improve on the
+    current one are ignored, so this can be called every iteration.
+    """
+    def set_best_cost(self, cost_max):
+        if cost_max >= self.cost_max:
+            return
+        self.cost_max = cost_max
+        semi_major_axis = cost_max / 2
+        semi_minor_axis = math.sqrt(max(cost_max ** 2 - self.cost_min ** 2, 0)) / 2
+        self.axes = np.array([semi_major_axis, semi_minor_axis])
+        # points left in the buffer were drawn from the old, larger ellipse
+        self.buffer = []
+
+    """
+    returns the current ellipse as a dictionary {"center", "axes", "angle"} that can be passed to
+    cv.ellipse, or None if no best cost has been set
+    """
+    def ellipse(self):
+        if self.axes is None:
+            return None
+        return {"center": (round(self.center[0]), round(self.center[1])),
+                "axes": (round(self.axes[0]), round(self.axes[1])),
+                "angle": math.degrees(self.angle)}
+
+    """
+    uniform and informed sampling do not use the current solution
+    """
+    def set_path(self, path):
+        pass
+
+    def sample(self):
+        while not self.buffer:
+            self._refill()
+        return self.buffer.pop()
+
+    def _candidates(self, n):
+        theta_random = 2 * np.pi * self.rng.random(n)
+        radius_random = np.sqrt(self.rng.random(n))
+        unit_disc = np.stack((radius_random * np.cos(theta_random), radius_random * np.sin(theta_random)))
+        points = self.rotation @ (self.axes[:, None] * unit_disc) + self.center[:, None]
+        points = np.floor(points).astype(np.int64)
+        return points[0], points[1]
+
+    def _refill(self):
+        if self.axes is None:
+            x_points, y_points = self.occupancy_map.random_free_points(self.batch_size, self.rng)
+            self.buffer = list(zip(x_points.tolist(), y_points.tolist()))
+            return
+        x_points, y_points = self._candidates(self.batch_size)
+        inside = (x_points >= 0) & (x_points < self.x_dim_len) & (y_points >= 0) & (y_points < self.y_dim_len)
+        x_points, y_points = x_points[inside], y_points[inside]
+        free = self.occupancy_map.grid[y_points, x_points]
+        self.buffer = list(zip(x_points[free].tolist(), y_points[free].tolist()))
+
+
+"""
+BiasedSampler
+
+Sampling strategy layer on top of an InformedSampler. Every sample is, with probability
+goal_bias, a free point in the goal region and, with probability path_bias, a free point near the
+current solution (a point on a random edge of the path moved by a normal offset of path_spread
+pixels). Otherwise it is a sample of the wrapped sampler.
+Path biased samples are only drawn once the planner has passed a path to set_path.
+
+sampler:     InformedSampler that draws the unbiased samples
+goal_point:  tuple - (x, y)
+goal_radius: radius of the goal region
+goal_bias:   probability of sampling the goal region
+path_bias:   probability of sampling near the current solution
+path_spread: standard deviation in pixels of the offset of path biased samples
+"""
+class BiasedSampler:
+    # biased candidates that fall outside the map or in an obstacle are redrawn this many times
+    MAX_ATTEMPTS = 10
+
+    def __init__(self, sampler:InformedSampler, goal_point, goal_radius, goal_bias=.05, path_bias=0, path_spread=10):
+        self.sampler = sampler
+        self.occupancy_map = sampler.occupancy_map
+        self.rng = sampler.rng
+        self.goal_point = goal_point
+        self.goal_radius = goal_radius
+        self.goal_bias = goal_bias
+        self.path_bias = path_bias
+        self.path_spread = path_spread
+        self.path = None
+
+    @property
+    def cost_min(self):
+        return self.sampler.cost_min
+
+    def set_best_cost(self, cost_max):
+        self.sampler.set_best_cost(cost_max)
+
+    def ellipse(self):
+        return self.sampler.ellipse()
+
+    """
+    path: list of (x, y) coordinates of the current best solution
+    """
+    def set_path(self, path):
+        self.path = np.array(path, np.float64) if len(path) > 1 else None
+
+    def sample(self):
+        draw = self.rng.random()
+        pt = None
+        if draw < self.goal_bias:
+            pt = self._sample_free(self._goal_candidate)
+        elif draw < self.goal_bias + self.path_bias and self.path is not None:
+            pt = self._sample_free(self._path_candidate)
+        if pt is None:
+            pt = self.sampler.sample()
+        return pt
+
+    def _sample_free(self, candidate):
+        for _ in range(self.MAX_ATTEMPTS):
+            x, y = candidate()
+            if 0 <= x < self.occupancy_map.x_dim_len and 0 <= y < self.occupancy_map.y_dim_len \
+                    and self.occupancy_map.grid[y, x]:
+                return (x, y)
+        return None
+
+    def _goal_candidate(self):
+        theta = 2 * math.pi * self.rng.random()
+        radius = self.goal_radius * math.sqrt(self.rng.random())
+        return (math.floor(self.goal_point[0] + radius * math.cos(theta)),
+                math.floor(self.goal_point[1] + radius * math.sin(theta)))
+
+    def _path_candidate(self):
+        edge = self.rng.integers(0, len(self.path) - 1)
+        pt = self.path[edge] + self.rng.random() * (self.path[edge + 1] - self.path[edge])
+        pt = pt + self.rng.normal(0, self.path_spread, 2)
+        return (math.floor(pt[0]), math.floor(pt[1]))
+
+
+"""
+ObstacleSampler
+
+Sampling strategy layer on top of an InformedSampler that puts more samples where the free space is
+narrow, which uniform sampling hardly ever hits. Every sample is, with probability obstacle_bias,
+a point of the obstacle strategy, and otherwise a sample of the wrapped sampler so the open space
+is still covered:
+    "bridge"   - bridge test: two points a normal offset of spread pixels apart that are both in
+                 obstacles, whose midpoint is free. Such midpoints are mostly in narrow passages
+    "gaussian" - a free point whose normal offset of spread pixels is in an obstacle, so the points
+                 are close to the boundary of the obstacles
+Cells outside the map count as obstacles. The candidates are tested in vectorized batches, and once
+a best cost is set only the points inside the informed ellipse are kept. On maps small enough to
+list their obstacle cells (see mapping.OccupancyMap.blocked_cells) the first point of every
+candidate is drawn from them, otherwise from the whole map. If MAX_BATCHES batches in a row give no
+point (a map without narrow passages) the sampler falls back to the wrapped sampler.
+
+sampler:       InformedSampler that draws the other samples
+strategy:      "bridge" or "gaussian"
+obstacle_bias: probability of drawing a sample of the strategy
+spread:        standard deviation in pixels of the offset between the two points of a candidate
+"""
+class ObstacleSampler:
+    MAX_BATCHES = 10
+
+    def __init__(self, sampler:InformedSampler, strategy="bridge", obstacle_bias=.5, spread=10):
+        if strategy not in OBSTACLE_STRATEGIES:
+            raise Exception("ObstacleSampler was passed an unknown strategy: " + str(strategy))
+        self.sampler = sampler
+        self.occupancy_map = sampler.occupancy_map
+        self.rng = sampler.rng
+        self.strategy = strategy
+        self.obstacle_bias = obstacle_bias
+        self.spread = spread
+        self.buffer = []
+
+    @property
+    def cost_min(self):
+        return self.sampler.cost_min
+
+    def set_best_cost(self, cost_max):
+        if cost_max < self.sampler.cost_max:
+            # points left in the buffer may be outside the new ellipse
+            self.buffer = []
+        self.sampler.set_best_cost(cost_max)
+
+    def ellipse(self):
+        return self.sampler.ellipse()
+
+    def set_path(self, path):
+        self.sampler.set_path(path)
+
+    def sample(self):
+        if self.obstacle_bias > 0 and self.rng.random() < self.obstacle_bias:
+            if not self.buffer:
+                self._refill()
+            if self.buffer:
+                return self.buffer.pop()
+        return self.sampler.sample()
+
+    """
+    True for the points inside the map that are free, False for the others
+    """
+    def _is_free(self, x_points, y_points):
+        inside = (x_points >= 0) & (x_points < self.occupancy_map.x_dim_len) & \
+                 (y_points >= 0) & (y_points < self.occupancy_map.y_dim_len)
+        free = np.zeros(len(x_points), np.bool_)
+        free[inside] = self.occupancy_map.grid[y_points[inside], x_points[inside]]
+        return free
+
+    def _in_ellipse(self, x_points, y_points):
+        if self.sampler.axes is None:
+            return np.ones(len(x_points), np.bool_)
+        offsets = np.stack((x_points - self.sampler.center[0], y_points - self.sampler.center[1]))
+        local = self.sampler.rotation.T @ offsets / self.sampler.axes[:, None]
+        return (local ** 2).sum(axis=0) <= 1
+
+    def _refill(self):
+        n = self.sampler.batch_size
+        occupancy_map = self.occupancy_map
+        blocked_cells = None
+        if occupancy_map.grid.size <= occupancy_map.FREE_CELLS_LIMIT:
+            blocked_cells = occupancy_map.blocked_cells
+            if len(blocked_cells) == 0:
+                self.obstacle_bias = 0
+                return
+        for _ in range(self.MAX_BATCHES):
+            if blocked_cells is None:
+                x1 = self.rng.integers(0, occupancy_map.x_dim_len, n)
+                y1 = self.rng.integers(0, occupancy_map.y_dim_len, n)
+            else:
+                y1, x1 = np.divmod(blocked_cells[self.rng.integers(0, len(blocked_cells), n)], occupancy_map.x_dim_len)
+            offsets = np.rint(self.rng.normal(0, self.spread, (2, n))).astype(np.int64)
+            x2 = x1 + offsets[0]
+            y2 = y1 + offsets[1]
+            free1 = self._is_free(x1, y1) if blocked_cells is None else np.zeros(n, np.bool_)
+            free2 = self._is_free(x2, y2)
+            if self.strategy == "bridge":
+                x_points = (x1 + x2) // 2
+                y_points = (y1 + y2) // 2
+                keep = ~free1 & ~free2
+                keep[keep] = self._is_free(x_points[keep], y_points[keep])
+            else:
+                x_points = np.where(free1, x1, x2)
+                y_points = np.where(free1, y1, y2)
+                keep = free1 != free2
+            keep[keep] = self._in_ellipse(x_points[keep], y_points[keep])
+            if keep.any():
+                self.buffer = list(zip(x_points[keep].tolist(), y_points[keep].tolist()))
+                return
+        # no narrow passages, only the wrapped sampler is used from now on
+        self.obstacle_bias = 0
+
+
+"""
+SharedCostSampler
+
+Wraps a sampler of a planner that runs alongside other planners on the same query, see
+parallel.py. Before every sample the best cost found by any of them is read from shared_cost, and
+when it went down it is set as the best cost of the wrapped sampler, so the informed ellipse shrinks
+to the best solution of all of the planners and not only to the solution of this one.
+
+sampler:     sampler of any of the strategies, see create_sampler
+shared_cost: multiprocessing.Value of a double holding the lowest cost_max found so far, the cost
+             of the best path up to the goal point (see planner.Planner.share_solutions)
+"""
+class SharedCostSampler:
+    def __init__(self, sampler, shared_cost):
+        self.sampler = sampler
+        self.occupancy_map = sampler.occupancy_map
+        self.rng = sampler.rng
+        self.shared_cost = shared_cost
+        self.cost_max = float('inf')
+
+    @property
+    def cost_min(self):
+        return self.sampler.cost_min
+
+    def set_best_cost(self, cost_max):
+        self.sampler.set_best_cost(cost_max)
+
+    def ellipse(self):
+        return self.sampler.ellipse()
+
+    def set_path(self, path):
+        self.sampler.set_path(path)
+
+    def sample(self):
+        # a cost below cost_min would collapse the ellipse onto the line from the start to the goal
+        cost_max = max(self.shared_cost.value, self.cost_min)
+        if cost_max < self.cost_max:
+            self.cost_max = cost_max
+            self.sampler.set_best_cost(cost_max)
+        return self.sampler.sample()
+
+
+"""
+create_sampler
+
+Returns the sampler of a sampling strategy:
+    "uniform"   - InformedSampler
+    "goal"      - BiasedSampler with goal biased sampling
+    "path"      - BiasedSampler with path biased sampling
+    "goal_path" - BiasedSampler with both
+    "bridge"    - ObstacleSampler with bridge test sampling
+    "gaussian"  - ObstacleSampler with Gaussian sampling near the obstacles
+goal_bias, path_bias and path_spread are passed to the BiasedSampler of the strategies that use them,
+and obstacle_bias and obstacle_spread to the ObstacleSampler.
+"""
+def create_sampler(occupancy_map, start_point, goal_point, goal_radius, strategy="uniform", rng=None,
+                   goal_bias=.05, path_bias=.2, path_spread=10, obstacle_bias=.5, obstacle_spread=10):
+    sampler = InformedSampler(occupancy_map, start_point, goal_point, rng=rng)
+    if strategy == "uniform":
+        return sampler
+    if strategy not in STRATEGIES:
+        raise Exception("create_sampler was passed an unknown strategy: " + str(strategy))
+    if strategy in OBSTACLE_STRATEGIES:
+        return ObstacleSampler(sampler, strategy, obstacle_bias, obstacle_spread)
+    return BiasedSampler(sampler, goal_point, goal_radius,
+                         goal_bias= goal_bias if strategy in ("goal", "goal_path") else 0,
+                         path_bias= path_bias if strategy in ("path", "goal_path") else 0,
+                         path_spread= path_spread)
@@ -0,0 +1,228 @@
+# spatial_index.py
+import math
+import heapq
+
+
+"""
+Spatial indexes over the explored nodes of a tree.
+
+Every index stores (coordinates, item) pairs and answers the same queries:
+    insert(pt, item)               add an item at pt
+    radius(pt, radius)             items with 0 < distance <= radius
+    nearest_iter(pt)               (distance, coordinates, item) in increasing distance order
+    k_nearest(pt, k)               the k closest items
+    nearest_valid(pt, is_valid)    closest item whose coordinates pass is_valid
+    clear()                        remove every item, so the index can be rebuilt after a tree is pruned
+
+so the planners can switch between backends with create_spatial_index().
+"""
+
+
+def _distance(pt1, pt2):
+    return math.sqrt((pt2[0] - pt1[0]) ** 2 + (pt2[1] - pt1[1]) ** 2)
+
+
+class _SpatialIndex:
+    def k_nearest(self, pt, k):
+        items = []
+        for dist, coordinates, item in self.nearest_iter(pt):
+            if len(items) == k:
+                break
+            items.append(item)
+        return items
+
+    def nearest_valid(self, pt, is_valid):
+        for dist, coordinates, item in self.nearest_iter(pt):
+            if is_valid(coordinates):
+                return item
+        return None
+
+
+"""
+GridIndex
+
+Hashes points into uniform square buckets of side cell_size. A radius query only visits
+the buckets overlapping the query disc, and nearest neighbor queries visit rings of buckets
+outward from the query point. Works best when cell_size is close to the rewiring radius.
+"""
+class GridIndex(_SpatialIndex):
+    def __init__(self, cell_size=10):
+        self.cell_size = cell_size
+        self.buckets = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, pt):
+        return (int(pt[0] // self.cell_size), int(pt[1] // self.cell_size))
+
+    def clear(self):
+        self.buckets = {}
+        self.size = 0
+
+    def insert(self, pt, item):
+        self.buckets.setdefault(self._cell(pt), []).append((pt, item))
+        self.size += 1
+
+    def radius(self, pt, radius):
+        items = []
+        x_min, y_min = self._cell((pt[0] - radius, pt[1] - radius))
+        x_max, y_max = self._cell((pt[0] + radius, pt[1] + radius))
+        for i in range(x_min, x_max + 1):
+            for j in range(y_min, y_max + 1):
+                for coordinates, item in self.buckets.get((i, j), ()):
+                    dist = _distance(pt, coordinates)
+                    if 0 < dist <= radius:
+                        items.append(item)
+        return items
+
+    def _ring(self, center, ring):
+        cx, cy = center
+        if ring == 0:
+            yield center
+            return
+        for i in range(cx - ring, cx + ring + 1):
+            yield (i, cy - ring)
+            yield (i, cy + ring)
+        for j in range(cy - ring + 1, cy + ring):
+            yield (cx - ring, j)
+            yield (cx + ring, j)
+
+    def nearest_iter(self, pt):
+        center = self._cell(pt)
+        candidates = []
+        seen = 0
+        ring = 0
+        counter = 0
+        while seen < self.size or candidates:
+            if seen < self.size:
+                for cell in self._ring(center, ring):
+                    for coordinates, item in self.buckets.get(cell, ()):
+                        heapq.heappush(candidates, (_distance(pt, coordinates), counter, coordinates, item))
+                        counter += 1
+                        seen += 1
+                # every point outside the rings visited so far is at least this far away
+                bound = ring * self.cell_size
+                ring += 1
+            else:
+                bound = float('inf')
+            while candidates and candidates[0][0] <= bound:
+                dist, _, coordinates, item = heapq.heappop(candidates)
+                yield dist, coordinates, item
+
+
+"""
+KDTreeIndex
+
+Incremental 2-d tree. Points are inserted as leaves without rebalancing, which keeps the
+expected depth logarithmic for the randomly ordered samples the planners produce.
+nearest_iter is a best-first traversal, so it yields points in increasing distance order
+without visiting subtrees that are farther away than the points already returned.
+"""
+class KDTreeIndex(_SpatialIndex):
+    _NODE = 0
+    _POINT = 1
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.root = None
+        self.size = 0
+
+    def insert(self, pt, item):
+        # node layout: [coordinates, item, axis, left, right]
+        new_node = [pt, item, 0, None, None]
+        self.size += 1
+        if self.root is None:
+            self.root = new_node
+            return
+        node = self.root
+        while True:
+            axis = node[2]
+            side = 3 if pt[axis] < node[0][axis] else 4
+            if node[side] is None:
+                new_node[2] = 1 - axis
+                node[side] = new_node
+                return
+            node = node[side]
+
+    def radius(self, pt, radius):
+        items = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            coordinates = node[0]
+            dist = _distance(pt, coordinates)
+            if 0 < dist <= radius:
+                items.append(node[1])
+            axis = node[2]
+            diff = pt[axis] - coordinates[axis]
+            if diff - radius < 0 and node[3] is not None:
+                stack.append(node[3])
+            if diff + radius >= 0 and node[4] is not None:
+                stack.append(node[4])
+        return items
+
+    def nearest_iter(self, pt):
+        if self.root is None:
+            return
+        inf = float('inf')
+        counter = 0
+        queue = [(0.0, counter, self._NODE, self.root, (-inf, -inf, inf, inf))]
+        while queue:
+            dist, _, kind, node, rect = heapq.heappop(queue)
+            if kind == self._POINT:
+                yield dist, node[0], node[1]
+                continue
+            counter += 1
+            heapq.heappush(queue, (_distance(pt, node[0]), counter, self._POINT, node, None))
+            axis = node[2]
+            split = node[0][axis]
+            x_min, y_min, x_max, y_max = rect
+            if axis == 0:
+                left_rect = (x_min, y_min, split, y_max)
+                right_rect = (split, y_min, x_max, y_max)
+            else:
+                left_rect = (x_min, y_min, x_max, split)
+                right_rect = (x_min, split, x_max, y_max)
+            for child, child_rect in ((node[3], left_rect), (node[4], right_rect)):
+                if child is not None:
+                    counter += 1
+                    heapq.heappush(queue, (_rect_distance(pt, child_rect), counter, self._NODE, child, child_rect))
+
+
+def _rect_distance(pt, rect):
+    x_min, y_min, x_max, y_max = rect
+    dx = max(x_min - pt[0], 0, pt[0] - x_max)
+    dy = max(y_min - pt[1], 0, pt[1] - y_max)
+    return math.sqrt(dx * dx + dy * dy)
+
+
+"""
+create_spatial_index
+
+backend:   "grid" or "kdtree"
+cell_size: bucket size of the grid backend, ignored by the kd-tree
+"""
+def create_spatial_index(backend="grid", cell_size=10):
+    if backend == "grid":
+        return GridIndex(cell_size=cell_size)
+    elif backend == "kdtree":
+        return KDTreeIndex()
+    else:
+        raise Exception("create_spatial_index was passed an unknown backend: " + str(backend))
+
+
+"""
+returns a new empty index with the same backend and cell size as index
+"""
+def create_empty_like(index):
+    if isinstance(index, GridIndex):
+        return GridIndex(cell_size=index.cell_size)
+    return KDTreeIndex()
@@ -0,0 +1,27 @@
+# test_prm.py
+import math
+import numpy as np
+import mapping
+import prm
+
+
+def build():
+    occupancy_map = mapping.get_occupancy_map(mapping.draw_simple_map2())
+    roadmap = prm.build_roadmap(occupancy_map, num_of_nodes=2000, connection_radius=30, rng=np.random.default_rng(0))
+    return occupancy_map, roadmap
+
+
+def test_nodes_near_finds_the_nodes_on_every_side():
+    _, roadmap = build()
+    pt = (150, 150)
+    expected = [node for node in range(len(roadmap)) if math.dist(roadmap.coordinates(node), pt) <= 30]
+    assert sorted(roadmap.nodes_near(pt, 30)) == expected
+
+
+def test_query_to_a_goal_up_and_to_the_left_of_the_start():
+    occupancy_map, roadmap = build()
+    start_point = (299, 299)
+    goal_point = (100, 150)
+    path, cost = prm.query(occupancy_map, roadmap, start_point, goal_point, connection_radius=30)
+    assert cost < float('inf')
+    assert path[0] == start_point and path[-1] == goal_point
@@ -0,0 +1,326 @@
+# tree.py
+import numpy as np
+import heapq
+import math
+
+
+NO_PARENT = -1
+
+
+"""
+Tree
+
+Array backed (struct of arrays) storage for the nodes of a search tree.
+Nodes are referred to by their integer id, which is their index in the arrays:
+    x, y    - coordinates of the node
+    c2c     - cost to come from the root
+    parent  - id of the parent node, NO_PARENT for the root
+children holds the ids of the children of every node, so a rewire can push its change in cost
+down the subtree of the rewired node. A detached subtree has no parent and an infinite c2c until
+it is rewired back into the tree.
+node_at is a sparse index from coordinates to node id. It only holds the coordinates that have
+been added to the tree, so lookups are O(1) without allocating anything per pixel of the map.
+The arrays double in size when they fill up, so adding a node is amortized O(1), and compact()
+removes nodes and shrinks them again. Only the first len(tree) entries of each array are valid.
+"""
+class Tree:
+    def __init__(self, capacity=1024):
+        self.x = np.zeros(capacity, np.int32)
+        self.y = np.zeros(capacity, np.int32)
+        self.c2c = np.zeros(capacity, np.float64)
+        self.parent = np.full(capacity, NO_PARENT, np.int32)
+        self.children = []
+        self.node_at = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = 2 * len(self.x)
+        for name in ("x", "y", "c2c", "parent"):
+            old = getattr(self, name)
+            new = np.full(capacity, NO_PARENT, old.dtype) if name == "parent" else np.zeros(capacity, old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add_node(self, coordinates, c2c, parent=NO_PARENT):
+        if self.size == len(self.x):
+            self._grow()
+        node_id = self.size
+        self.x[node_id] = coordinates[0]
+        self.y[node_id] = coordinates[1]
+        self.c2c[node_id] = c2c
+        self.parent[node_id] = parent
+        self.node_at[(int(coordinates[0]), int(coordinates[1]))] = node_id
+        self.children.append([])
+        if parent != NO_PARENT:
+            self.children[parent].append(node_id)
+        self.size += 1
+        return node_id
+
+    """
+    returns the id of the node at coordinates, or None if the coordinates are not in the tree
+    """
+    def find(self, coordinates):
+        return self.node_at.get((coordinates[0], coordinates[1]))
+
+    def coordinates(self, node_id):
+        return (int(self.x[node_id]), int(self.y[node_id]))
+
+    def parent_coordinates(self, node_id):
+        parent = self.parent[node_id]
+        if parent == NO_PARENT:
+            return None
+        return self.coordinates(parent)
+
+    """
+    returns the ids of node_id and all of its descendants
+    """
+    def subtree(self, node_id):
+        nodes = [node_id]
+        i = 0
+        while i < len(nodes):
+            nodes.extend(self.children[nodes[i]])
+            i += 1
+        return nodes
+
+    """
+    makes parent the new parent of node_id with cost to come c2c, and applies the change in
+    cost to every descendant of node_id. Returns the ids of the nodes whose cost changed.
+    """
+    def rewire(self, node_id, parent, c2c):
+        old_parent = self.parent[node_id]
+        if old_parent != NO_PARENT:
+            self.children[old_parent].remove(node_id)
+        self.children[parent].append(node_id)
+        self.parent[node_id] = parent
+
+        updated = self.subtree(node_id)
+        if math.isinf(self.c2c[node_id]):
+            # a detached subtree has no costs to shift, rebuild them from the new root down
+            self.c2c[node_id] = c2c
+            for child in updated[1:]:
+                parent = self.parent[child]
+                self.c2c[child] = self.c2c[parent] + math.dist(self.coordinates(child), self.coordinates(parent))
+            return updated
+        delta = c2c - self.c2c[node_id]
+        self.c2c[updated] += delta
+        return updated
+
+    """
+    cuts node_id from its parent. node_id and its descendants keep their edges, but get an
+    infinite c2c until node_id is rewired. Returns the ids of the detached nodes.
+    """
+    def detach(self, node_id):
+        parent = self.parent[node_id]
+        if parent != NO_PARENT:
+            self.children[parent].remove(node_id)
+        self.parent[node_id] = NO_PARENT
+        detached = self.subtree(node_id)
+        self.c2c[detached] = np.inf
+        return detached
+
+    """
+    keeps the nodes where keep is True and gives them new ids in the same order. The subtree of
+    every removed node has to be removed too. The arrays are reallocated to fit the remaining
+    nodes, so their memory is given back.
+    Returns an array with the new id of every old node, NO_PARENT for the removed ones.
+    """
+    def compact(self, keep):
+        kept = np.flatnonzero(keep[:self.size])
+        new_ids = np.full(self.size, NO_PARENT, np.int32)
+        new_ids[kept] = np.arange(len(kept), dtype=np.int32)
+
+        capacity = max(1024, 2 * len(kept))
+        for name in ("x", "y", "c2c", "parent"):
+            old = getattr(self, name)
+            new = np.full(capacity, NO_PARENT, old.dtype) if name == "parent" else np.zeros(capacity, old.dtype)
+            new[:len(kept)] = old[kept]
+            setattr(self, name, new)
+        has_parent = self.parent[:len(kept)] != NO_PARENT
+        self.parent[:len(kept)][has_parent] = new_ids[self.parent[:len(kept)][has_parent]]
+
+        self.children = [[int(new_ids[child]) for child in self.children[old_id] if new_ids[child] != NO_PARENT]
+                         for old_id in kept.tolist()]
+        self.node_at = {(int(self.x[node_id]), int(self.y[node_id])): node_id for node_id in range(len(kept))}
+        self.size = len(kept)
+        return new_ids
+
+    """
+    joins a second tree to this one: copies the path from node_id of other up to the root of other
+    as a chain of new nodes below parent, so the root of other becomes a leaf of this tree. Used by
+    the bidirectional planners to turn the tree grown from the goal into the end of the solution.
+    Returns the ids of the new nodes, the last one is the root of other.
+    """
+    def graft(self, other, node_id, parent):
+        new_ids = []
+        for other_id in reversed(other.path_to(node_id)):
+            coordinates = other.coordinates(other_id)
+            c2c = self.c2c[parent] + math.dist(self.coordinates(parent), coordinates)
+            parent = self.add_node(coordinates, c2c, parent)
+            new_ids.append(parent)
+        return new_ids
+
+    """
+    returns the ids of the nodes from the root to node_id
+    """
+    def path_to(self, node_id):
+        path = []
+        while node_id != NO_PARENT:
+            path.append(int(node_id))
+            node_id = self.parent[node_id]
+        path.reverse()
+        return path
+
+
+"""
+SolutionHeap
+
+Min-heap of the nodes of a tree that are inside the goal region, ordered by cost to come.
+Costs only go down when the tree is rewired, so update() pushes a new entry for every goal node
+whose cost changed and best() drops the outdated entries it finds at the top of the heap.
+"""
+class SolutionHeap:
+    def __init__(self, tree:Tree):
+        self.tree = tree
+        self.heap = []
+        self.members = set()
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, node_id):
+        return node_id in self.members
+
+    def add(self, node_id):
+        self.members.add(node_id)
+        heapq.heappush(self.heap, (float(self.tree.c2c[node_id]), node_id))
+
+    def update(self, node_ids):
+        for node_id in node_ids:
+            if node_id in self.members:
+                heapq.heappush(self.heap, (float(self.tree.c2c[node_id]), node_id))
+
+    """
+    renumbers the goal nodes after Tree.compact, dropping the removed ones
+    new_ids: array returned by Tree.compact
+    """
+    def remap(self, new_ids):
+        self.members = {int(new_ids[node_id]) for node_id in self.members if new_ids[node_id] != NO_PARENT}
+        self.heap = [(float(self.tree.c2c[node_id]), node_id) for node_id in self.members]
+        heapq.heapify(self.heap)
+
+    """
+    returns the id of the goal node with the lowest cost to come, or None if there are no goal nodes
+    """
+    def best(self):
+        while self.heap:
+            cost, node_id = self.heap[0]
+            if cost == self.tree.c2c[node_id]:
+                return node_id
+            heapq.heappop(self.heap)
+        return None
+
+
+"""
+ConnectionHeap
+
+Min-heap of the connections between a tree grown from the start point and one grown from the goal
+point (see rrt_star.explore_bidirectional). Connection i joins start_nodes[i] and goal_nodes[i]
+with a free edge of length lengths[i], and costs the c2c of both of its nodes plus that length.
+Like in SolutionHeap the costs only go down when the trees are rewired, so only the connections of
+the rewired nodes get a new entry and best() drops the outdated entries at the top of the heap.
+
+sides[0] and sides[1] take the place of the SolutionHeap of the start and the goal tree: their
+update() is given the nodes that rewiring changed in that tree.
+"""
+class ConnectionHeap:
+    def __init__(self, start_tree:Tree, goal_tree:Tree):
+        self.trees = (start_tree, goal_tree)
+        self.start_nodes = []
+        self.goal_nodes = []
+        self.lengths = []
+        # ids of the connections of every node, for the start and the goal tree
+        self.connections = ({}, {})
+        self.heap = []
+        self.sides = (ConnectionSide(self, 0), ConnectionSide(self, 1))
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def cost(self, connection):
+        start_tree, goal_tree = self.trees
+        return float(start_tree.c2c[self.start_nodes[connection]]) + self.lengths[connection] + \
+            float(goal_tree.c2c[self.goal_nodes[connection]])
+
+    def add(self, start_node, goal_node, length):
+        connection = len(self.lengths)
+        self.start_nodes.append(start_node)
+        self.goal_nodes.append(goal_node)
+        self.lengths.append(length)
+        self.connections[0].setdefault(start_node, []).append(connection)
+        self.connections[1].setdefault(goal_node, []).append(connection)
+        heapq.heappush(self.heap, (self.cost(connection), connection))
+
+    """
+    pushes a new entry for every connection of the nodes of the tree on side (0 start, 1 goal)
+    """
+    def update(self, side, node_ids):
+        connections = self.connections[side]
+        for node_id in node_ids:
+            for connection in connections.get(node_id, ()):
+                heapq.heappush(self.heap, (self.cost(connection), connection))
+
+    """
+    returns the id of the cheapest connection (the lowest id on a tie), or None if there is none
+    """
+    def best(self):
+        while self.heap:
+            cost, connection = self.heap[0]
+            if cost == self.cost(connection):
+                return connection
+            heapq.heappop(self.heap)
+        return None
+
+
+class ConnectionSide:
+    def __init__(self, connections:ConnectionHeap, side):
+        self.connections = connections
+        self.side = side
+
+    def update(self, node_ids):
+        self.connections.update(self.side, node_ids)
+
+
+"""
+returns the dictionary the planners pass to their on_solution callback when they find a better
+solution:
+    cost      - length of the path
+    path      - list of (x, y) coordinates from the root to node_id
+    iteration - iteration the solution was found in
+    elapsed   - seconds since the search started
+"""
+def solution_record(tree:Tree, node_id, iteration, elapsed):
+    return path_record([tree.coordinates(i) for i in tree.path_to(node_id)], iteration, elapsed)
+
+
+"""
+solution_record of a path given as a list of (x, y) coordinates
+"""
+def path_record(path, iteration, elapsed):
+    cost = sum(math.dist(pt1, pt2) for pt1, pt2 in zip(path[:-1], path[1:]))
+    return {"cost": cost, "path": path, "iteration": iteration, "elapsed": elapsed}
+
+
+"""
+returns a Tree that only holds the path, given as a list of (x, y) coordinates, as a chain of nodes
+from its first point. Used by the planners that do not grow a tree of their own
+"""
+def path_tree(path):
+    tree = Tree()
+    node = NO_PARENT
+    for pt in path:
+        c2c = 0 if node == NO_PARENT else tree.c2c[node] + math.dist(tree.coordinates(node), pt)
+        node = tree.add_node(pt, c2c, node)
+    return tree
@@ -0,0 +1,112 @@
+# visualization.py
+import time
+import numpy as np
+import cv2 as cv
+import mapping
+
+
+"""
+TreeRenderer
+
+Draws a tree while it is being explored without redrawing it from scratch.
+The tree is drawn on a persistent canvas: add_edge draws a new edge and rewire_edge erases the old
+edge of a rewired node and draws the new one. The current solution and ellipse are only drawn on
+a copy of the canvas when a frame is shown, and show() is throttled to frame_rate frames per second.
+
+Planners take an optional renderer. When they are given None (headless mode) they never call
+into OpenCV.
+
+color_map:   numpy_array of a color map. map is 3 dimensions [y, x, [color]]
+window_name: name of the OpenCV window
+goal_point:  tuple - (x, y), drawn as a gray circle if given
+goal_radius: radius of the goal circle
+frame_rate:  maximum number of frames shown per second
+"""
+class TreeRenderer:
+    def __init__(self, color_map, window_name, goal_point=None, goal_radius=0, frame_rate=10):
+        self.background = color_map.copy()
+        if goal_point is not None:
+            cv.circle(self.background, goal_point, radius=goal_radius, color=mapping.GRAY, thickness=-1)
+        self.canvas = self.background.copy()
+        self.window_name = window_name
+        self.frame_period = 1 / frame_rate
+        self.last_frame_time = 0
+        self.solution = None
+        self.ellipse = None
+
+    def add_edge(self, child_coordinates, parent_coordinates):
+        mapping.draw_node(child_coordinates=child_coordinates,
+                          parent_coordinates=parent_coordinates,
+                          map= self.canvas, color= mapping.BLUE)
+
+    def rewire_edge(self, child_coordinates, old_parent_coordinates, new_parent_coordinates):
+        if old_parent_coordinates is not None:
+            self.__erase_edge(child_coordinates, old_parent_coordinates)
+        self.add_edge(child_coordinates, new_parent_coordinates)
+
+    """
+    clears the canvas and draws every edge of tree again, after nodes were removed from it
+    """
+    def redraw(self, tree):
+        self.canvas = self.background.copy()
+        for node_id in range(1, len(tree)):
+            parent_coordinates = tree.parent_coordinates(node_id)
+            if parent_coordinates is not None:
+                self.add_edge(tree.coordinates(node_id), parent_coordinates)
+
+    """
+    restores the background under an edge. Only the bounding box of the edge is touched.
+    """
+    def __erase_edge(self, pt1, pt2):
+        pt1 = tuple(int(mapping.SCALE_FACTOR * _) for _ in pt1)
+        pt2 = tuple(int(mapping.SCALE_FACTOR * _) for _ in pt2)
+        x_min = max(min(pt1[0], pt2[0]) - 1, 0)
+        y_min = max(min(pt1[1], pt2[1]) - 1, 0)
+        x_max = min(max(pt1[0], pt2[0]) + 2, self.canvas.shape[1])
+        y_max = min(max(pt1[1], pt2[1]) + 2, self.canvas.shape[0])
+        mask = np.zeros((y_max - y_min, x_max - x_min), np.uint8)
+        cv.line(mask, (pt1[0] - x_min, pt1[1] - y_min), (pt2[0] - x_min, pt2[1] - y_min), 255, thickness=2)
+        region = self.canvas[y_min:y_max, x_min:x_max]
+        region[mask > 0] = self.background[y_min:y_max, x_min:x_max][mask > 0]
+        # the end points are shared with other edges, put them back
+        cv.circle(self.canvas, pt1, radius=3, color=mapping.BLUE, thickness=-1)
+        cv.circle(self.canvas, pt2, radius=3, color=mapping.BLUE, thickness=-1)
+
+    """
+    solution: list of coordinates from the start point to the goal
+    ellipse:  dictionary {"center", "axes", "angle"} or None
+    """
+    def set_solution(self, solution, ellipse=None):
+        self.solution = solution
+        self.ellipse = ellipse
+
+    def draw_frame(self):
+        frame = self.canvas.copy()
+        if self.solution:
+            for child, parent in zip(self.solution[1:], self.solution[:-1]):
+                mapping.draw_node(child_coordinates=child, parent_coordinates=parent,
+                                  map= frame, color= mapping.RED)
+            mapping.draw_node(child_coordinates=self.solution[-1], parent_coordinates=None,
+                              map= frame, color= mapping.GREEN)
+        if self.ellipse is not None:
+            cv.ellipse(img= frame,
+                       center= self.ellipse["center"],
+                       axes=self.ellipse["axes"],
+                       angle=self.ellipse["angle"],
+                       startAngle=0,
+                       endAngle=360,
+                       color=mapping.BLACK,
+                       thickness= 2)
+        return frame
+
+    """
+    shows the current frame if the last one was shown more than 1/frame_rate seconds ago
+    force: show the frame regardless of the frame rate
+    """
+    def show(self, force=False, wait=1):
+        now = time.time()
+        if not force and now - self.last_frame_time < self.frame_period:
+            return
+        self.last_frame_time = now
+        cv.imshow(self.window_name, self.draw_frame())
+        cv.waitKey(wait)